@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ Batch jobs for lesson preparation.
+# Every message of a job goes through the normal chat pipeline on a shared, bounded worker pool,
+# and results are recorded in the order they finish. A job keeps running if the client
+# disconnects; its results can be streamed again from any position with its job id.
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "100"))
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "3600"))
+BATCH_CHATBASE_RPS = float(os.getenv("BATCH_CHATBASE_RPS", "10"))
+BATCH_ELEVENLABS_RPS = float(os.getenv("BATCH_ELEVENLABS_RPS", "5"))
+
+
+class TooManyJobs(Exception):
+    """BATCH_MAX_JOBS jobs are already kept and none of them can be dropped yet."""
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` calls per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Function to wait until a call is allowed
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchJob:
+    def __init__(self, messages):
+        self.id = uuid.uuid4().hex
+        self.messages = messages
+        self.results = []  # in completion order
+        self.failed = 0
+        self.created = time.monotonic()
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return len(self.results) == len(self.messages)
+
+    def add(self, result):
+        with self._changed:
+            result["seq"] = len(self.results)
+            self.results.append(result)
+            if not result["ok"]:
+                self.failed += 1
+            self._changed.notify_all()
+
+    # Function to yield results from position `start` on, waiting for new ones until the job ends
+    def iter_results(self, start=0):
+        position = max(0, start)
+        while True:
+            with self._changed:
+                while position >= len(self.results) and not self.finished:
+                    self._changed.wait()
+                pending = self.results[position:]
+            yield from pending
+            position += len(pending)
+            if self.finished and position >= len(self.results):
+                return
+
+    def summary(self):
+        return {"job_id": self.id, "total": len(self.messages), "completed": len(self.results), "failed": self.failed}
+
+
+class BatchRunner:
+    def __init__(self, process, workers=BATCH_WORKERS, max_jobs=BATCH_MAX_JOBS, ttl=BATCH_JOB_TTL):
+        self.process = process  # process(message) -> dict of result fields, raises on failure
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to start a job for a list of messages, raises TooManyJobs when max_jobs are running
+    def submit(self, messages):
+        job = BatchJob(messages)
+        with self._lock:
+            self._prune()
+            if len(self._jobs) >= self.max_jobs:
+                raise TooManyJobs(f"{len(self._jobs)} batch jobs are still running")
+            self._jobs[job.id] = job
+        for index, message in enumerate(messages):
+            self._executor.submit(self._run, job, index, message)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, index, message):
+        try:
+            job.add({"index": index, "ok": True, "message": message, **self.process(message)})
+        except Exception as e:
+            job.add({"index": index, "ok": False, "message": message, "error": str(e)})
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {"jobs": len(jobs), "running": sum(not job.finished for job in jobs)}
+
+    # Forget finished jobs past their TTL, and the oldest finished ones past max_jobs
+    def _prune(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and (now - job.created > self.ttl or len(self._jobs) >= self.max_jobs):
+                del self._jobs[job_id]
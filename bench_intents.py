@@ -0,0 +1,60 @@
+import random
+import sys
+import time
+
+from intents import IntentEngine, tokenize
+
+# Micro-benchmark: compiled intent engine vs. the old chain of `in` checks.
+# Usage: python bench_intents.py [number of rules]
+
+RULES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+PATTERNS_PER_RULE = 3
+MESSAGES = 2000
+
+random.seed(42)
+vocabulary = [f"w{i}" for i in range(20000)]
+
+
+def random_phrase(min_words, max_words):
+    return " ".join(random.choice(vocabulary) for _ in range(random.randint(min_words, max_words)))
+
+
+rules = [
+    {"name": f"rule{i}", "patterns": [random_phrase(1, 3) for _ in range(PATTERNS_PER_RULE)], "response": f"reply {i}"}
+    for i in range(RULES)
+]
+messages = [random_phrase(5, 20) for _ in range(MESSAGES)]
+# Make about a third of the messages hit a rule
+for i in range(0, MESSAGES, 3):
+    messages[i] += " " + random.choice(random.choice(rules)["patterns"])
+
+
+# The old approach: try each rule's patterns in order with substring checks
+def substring_chain(text):
+    text = text.lower()
+    for rule in rules:
+        for pattern in rule["patterns"]:
+            if pattern in text:
+                return rule["response"]
+    return None
+
+
+start = time.perf_counter()
+engine = IntentEngine(rules)
+build_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+engine_hits = sum(1 for message in messages if engine.match(message))
+engine_seconds = time.perf_counter() - start
+
+sample = messages[:200]
+start = time.perf_counter()
+chain_hits = sum(1 for message in sample if substring_chain(message))
+chain_seconds = (time.perf_counter() - start) * len(messages) / len(sample)
+
+average_words = sum(len(tokenize(message)) for message in messages) / len(messages)
+print(f"rules: {RULES} ({RULES * PATTERNS_PER_RULE} patterns), messages: {MESSAGES} (~{average_words:.0f} words)")
+print(f"build:            {build_seconds * 1000:.1f} ms, {len(engine._goto)} states")
+print(f"intent engine:    {engine_seconds / MESSAGES * 1e6:.1f} us/message, {engine_hits} matched")
+print(f"substring chain:  {chain_seconds / MESSAGES * 1e6:.1f} us/message (estimated from {len(sample)}), "
+      f"{chain_hits} of {len(sample)} matched")
@@ -1,11 +1,12 @@
 import os
-import requests
-import openai
-import elevenlabs
 from dotenv import load_dotenv
-from pydub import AudioSegment
-from pydub.playback import play
 import tempfile
+import threading
+import upstream
+from reply_cache import ReplyCache
+from provider_router import make_chat_router, AllProvidersFailed
+from intents import IntentEngine
+from sessions import make_store
 
 # Load environment variables
 load_dotenv()
@@ -13,60 +14,84 @@ load_dotenv()
 # API Keys
 CHATBASE_API_KEY = os.getenv("CHATBASE_API_KEY")
 CHATBASE_BOT_ID = "WwbCX3dW4fAFsG3MKCUXR"  # Replace with your Chatbase bot ID
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Shared state, built on the first chatbot_reply() call by init_state() so that importing this
+# module loads no numpy and creates no files (e.g. sessions.sqlite3), like chatbot_api.init_state
+intent_engine = reply_cache = sessions = router = None
+_state_lock = threading.Lock()
+
+# Function to build the intents, reply cache, session store and router (once per process)
+def init_state():
+    global intent_engine, reply_cache, sessions, router
+    with _state_lock:
+        if router is not None:
+            return
+
+        # Canned answers for greetings and small talk, answered without any API call
+        intent_engine = IntentEngine.from_file()
+
+        # Cache of replies to common questions
+        reply_cache = ReplyCache()
+
+        # Conversation history for callers that pass a session_id
+        sessions = make_store()
+
+        # Chatbase first, OpenAI as a hedged fallback, with a circuit breaker per provider
+        router = make_chat_router(bot_id=CHATBASE_BOT_ID)
 
 # Function to get a response from Chatbase
 def get_chatbase_response(user_message):
-    url = "https://www.chatbase.co/api/v1/chat"
-    headers = {
-        "Authorization": f"Bearer {CHATBASE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "chatbotId": CHATBASE_BOT_ID,
-        "messages": [{"role": "user", "content": user_message}]
-    }
-    
-    response = requests.post(url, headers=headers, json=data)
-    
-    if response.status_code == 200:
-        return response.json().get("text")  # Extract chatbot's reply
-    else:
+    try:
+        return upstream.chatbase_chat([{"role": "user", "content": user_message}], bot_id=CHATBASE_BOT_ID)
+    except upstream.UpstreamError:
         return None  # Return None if Chatbase fails
 
 # Function to get a response from OpenAI (fallback)
 def get_openai_response(user_message):
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": "You are a helpful assistant for English learners."},
-                      {"role": "user", "content": user_message}]
-        )
-        return response.choices[0].message.content
+        return upstream.openai_chat([{"role": "system", "content": "You are a helpful assistant for English learners."},
+                                     {"role": "user", "content": user_message}])
     except Exception as e:
         return f"OpenAI error: {e}"
 
 # Main function to get a chatbot response
-def chatbot_reply(user_message):
-    chatbase_response = get_chatbase_response(user_message)
-    
-    if chatbase_response:  # If Chatbase replies, use it
-        print("✅ Chatbase responded!")
-        return chatbase_response
-    else:  # Otherwise, fall back to OpenAI
-        print("❌ Chatbase did NOT respond. Falling back to OpenAI...")
-        return get_openai_response(user_message)
+def chatbot_reply(user_message, session_id=None):
+    init_state()
+    messages = sessions.messages(session_id, user_message)
+    first_turn = len(messages) == 1  # the reply cache only holds answers given without earlier context
+
+    response = intent_engine.reply(user_message)  # Greeting or small talk
+    if not response and first_turn:
+        response = reply_cache.get(user_message)  # Common question, answered before
+
+    if not response:
+        # Chatbase, or OpenAI if Chatbase is slow, failing or switched off by its breaker
+        try:
+            provider, response = router.call(messages)
+        except AllProvidersFailed as e:
+            print("❌ No provider responded:", e)
+            return f"Chatbot error: {e}"
+
+        print(f"✅ {provider} responded!")
+        if first_turn:
+            reply_cache.put(user_message, response)
+
+    if session_id:
+        sessions.append(session_id, user_message, response)
+    return response
 
 # Function to convert text to speech using ElevenLabs
 def text_to_speech(text):
     if not ELEVENLABS_API_KEY:
         print("⚠️ ElevenLabs API key is missing. Cannot generate speech.")
         return
-    
+
+    # Imported here so that importing this module doesn't load the ElevenLabs SDK or pydub
+    import elevenlabs
+    from pydub import AudioSegment
+    from pydub.playback import play
+
     try:
         audio = elevenlabs.generate(
             text=text,
@@ -86,13 +111,14 @@ def text_to_speech(text):
     except Exception as e:
         print(f"⚠️ ElevenLabs error: {e}")
 
-# Start chatbot
-print("Chatbot script is running...")
+if __name__ == "__main__":
+    # Start chatbot
+    print("Chatbot script is running...")
 
-# Test the chatbot
-user_input = "How do I improve my English?"
-reply = chatbot_reply(user_input)
-print("Chatbot reply:", reply)
+    # Test the chatbot
+    user_input = "How do I improve my English?"
+    reply = chatbot_reply(user_input)
+    print("Chatbot reply:", reply)
 
-# Convert text reply to speech
-text_to_speech(reply)
+    # Convert text reply to speech
+    text_to_speech(reply)
@@ -1,3 +1,8 @@
+from intents import IntentEngine
+
+# Rules live in intents.json; any matching phrase is enough for this offline bot
+engine = IntentEngine.from_file()
+
 def simple_chatbot():
     print("Hello! I'm your friendly chatbot. Type 'exit' to end the conversation.")
 
@@ -9,18 +14,11 @@ def simple_chatbot():
             break
 
         # Basic responses
-        elif "hello" in user_input or "hi" in user_input:
-            print("Chatbot: Hi there! How can I help you?")
-        elif "how are you" in user_input:
-            print("Chatbot: I'm just a bot, but I'm doing great! How about you?")
-        elif "your name" in user_input:
-            print("Chatbot: I'm a simple chatbot. You can call me Chatty!")
-        elif "weather" in user_input:
-            print("Chatbot: I'm not connected to the internet, but I hope it's sunny where you are!")
-        elif "joke" in user_input:
-            print("Chatbot: Why don’t scientists trust atoms? Because they make up everything!")
+        reply = engine.reply(user_input, min_coverage=0)
+        if reply:
+            print(f"Chatbot: {reply}")
         else:
             print("Chatbot: I'm not sure how to respond to that. Can you ask me something else?")
 
 # Run the chatbot
-simple_chatbot()
\ No newline at end of file
+simple_chatbot()
@@ -1,68 +1,499 @@
 import os
-import requests
-from flask import Flask, request, jsonify, send_from_directory
+import re
+import json
+import uuid
+import queue
+import time
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Blueprint, request, jsonify, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS  # ✅ Enables cross-origin requests
+import upstream
+import metrics
+from tts_cache import TTSCache
+from reply_cache import ReplyCache, normalize
+from provider_router import make_chat_router, AllProvidersFailed
+from intents import IntentEngine
+from request_log import RequestLog
+from singleflight import Group
+from priority_pool import PriorityPool
+from sessions import make_store
+from batch import BatchRunner, RateLimiter, TooManyJobs, BATCH_MAX_ITEMS, BATCH_CHATBASE_RPS, BATCH_ELEVENLABS_RPS
 
-# ✅ Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Allow all CORS requests
+# ✅ Routes live on a blueprint; the Flask app itself is built by create_app() (see the end of this file)
+api = Blueprint("api", __name__)
 
-# ✅ Load API keys from environment variables
-CHATBASE_API_KEY = os.getenv("CHATBASE_API_KEY")
-CHATBASE_BOT_ID = os.getenv("CHATBASE_BOT_ID")
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+# ✅ Voice settings (API keys are loaded by upstream.py)
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "YOUR_DEFAULT_VOICE_ID")
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+ELEVENLABS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.8}
 
-# ✅ Ensure static folder exists
-os.makedirs("static", exist_ok=True)
+# ✅ Public address used to build audio URLs, and how many sentences we synthesize at once
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://127.0.0.1:4000")
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", os.getenv("ELEVENLABS_MAX_CONCURRENCY", "8")))
 
-@app.route("/chat", methods=["POST"])
+# ✅ A sentence ends with . ! or ? followed by whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# ✅ Audio keys are SHA-256 hex digests
+AUDIO_KEY = re.compile(r"[0-9a-f]{64}")
+
+# ✅ Warm-up: providers to open connections to before the worker reports ready (empty = none)
+WARMUP_PROVIDERS = [p for p in os.getenv("WARMUP_PROVIDERS", "chatbase,openai,elevenlabs").split(",") if p]
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+
+# ✅ Shared state, built by init_state() from create_app() so importing this module stays fast
+# and has no side effects (no threads, files or connections)
+tts_executor = tts_cache = intent_engine = reply_cache = router = sessions = reply_flight = request_log = None
+batch_chat_limiter = batch_tts_limiter = batch_runner = None
+
+# ✅ Set once warm-up has finished; /readyz answers 503 until then
+ready = threading.Event()
+warmup_report = {}
+_warmup_thread = None
+_state_lock = threading.Lock()
+_app_lock = threading.Lock()
+
+
+# Function to build the shared pools, caches and stores (once per process)
+def init_state():
+    global tts_executor, tts_cache, intent_engine, reply_cache, router, sessions, reply_flight, request_log
+    global batch_chat_limiter, batch_tts_limiter, batch_runner
+    if tts_cache is not None:
+        return
+
+    # ✅ Ensure static folder exists
+    os.makedirs("static", exist_ok=True)
+
+    # ✅ Shared pool for per-sentence speech synthesis in streaming mode, earliest sentences first
+    tts_executor = PriorityPool(TTS_WORKERS, name="tts")
+
+    # ✅ Synthesized speech is cached under cache/tts/ by content hash
+    tts_cache = TTSCache()
+
+    # ✅ Greetings and small talk are answered locally from intents.json
+    intent_engine = IntentEngine.from_file()
+
+    # ✅ Replies to common questions are answered from memory
+    reply_cache = ReplyCache()
+
+    # ✅ Chatbase first, OpenAI as a hedged fallback, with a circuit breaker per provider
+    router = make_chat_router()
+
+    # ✅ Conversation history per session_id, trimmed to a fixed token budget
+    sessions = make_store()
+
+    # ✅ Identical questions asked at the same moment share one upstream call
+    reply_flight = Group()
+
+    # ✅ Every /chat call is appended to logs/requests.jsonl (for replay.py) by a background thread
+    request_log = RequestLog()
+
+    # ✅ Batch jobs share a bounded worker pool and stay under per-provider request rates
+    batch_chat_limiter = RateLimiter(BATCH_CHATBASE_RPS)
+    batch_tts_limiter = RateLimiter(BATCH_ELEVENLABS_RPS)
+    batch_runner = BatchRunner(process_batch_item)
+
+
+# Function to open pooled connections to every provider in parallel, then mark the worker ready
+def warm_up():
+    def warm(provider):
+        start = time.perf_counter()
+        opened = upstream.warm(provider, WARMUP_CONNECTIONS)
+        warmup_report[provider] = {"connections": opened, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(WARMUP_PROVIDERS))) as pool:
+            list(pool.map(warm, WARMUP_PROVIDERS))
+    finally:
+        ready.set()  # a provider that can't be reached yet is the breaker's job, not a reason to stay unready
+
+
+# Function to build the Flask app: shared state now, upstream connections in the background
+def create_app():
+    global _warmup_thread
+    with _state_lock:
+        if _warmup_thread is None:
+            start = time.perf_counter()
+            init_state()
+            warmup_report["state_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            _warmup_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warmup_thread.start()
+
+    app = Flask(__name__, static_folder=None)  # static/ is served by serve_audio below, top-level files only
+    CORS(app)  # Allow all CORS requests
+    app.register_blueprint(api)
+    return app
+
+
+# Function to render text with ElevenLabs, yields MP3 chunks as they arrive
+def render_speech(text, voice_id, model_id, voice_settings):
+    start, size, ok = time.perf_counter(), 0, False
+    try:
+        for chunk in upstream.elevenlabs_tts_stream(text, voice_id, model_id, voice_settings):
+            if not size:
+                metrics.observe("elevenlabs_first_chunk", time.perf_counter() - start)
+            size += len(chunk)
+            yield chunk
+        ok = True
+    finally:
+        metrics.observe("elevenlabs", time.perf_counter() - start, ok)
+        metrics.inc("audio_bytes", size)
+
+
+# Function to build the public URL of the audio for a key
+def audio_url(key):
+    return f"{PUBLIC_BASE_URL}/audio/{key}.mp3"
+
+
+# Function to get speech for a text now (from the cache when possible), returns the audio URL
+def text_to_speech(text):
+    with metrics.span("tts"):
+        key, _ = tts_cache.get_or_create(text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID, ELEVENLABS_VOICE_SETTINGS,
+                                         render_speech)
+    return audio_url(key)
+
+
+# Function to get a reply from the providers and remember it
+def fetch_reply(user_message):
+    _, chatbot_text = router.call([{"role": "user", "content": user_message}])
+    reply_cache.put(user_message, chatbot_text)
+    return chatbot_text
+
+
+# Function to run one batch message through the Chatbase -> ElevenLabs pipeline
+def process_batch_item(user_message):
+    chatbot_text = intent_engine.reply(user_message) or reply_cache.get(user_message)
+    if not chatbot_text:
+        def limited_fetch():
+            batch_chat_limiter.acquire()
+            return fetch_reply(user_message)
+        chatbot_text = reply_flight.do(normalize(user_message), limited_fetch)
+
+    def limited_render(*job):
+        batch_tts_limiter.acquire()
+        yield from render_speech(*job)
+
+    key, _ = tts_cache.get_or_create(chatbot_text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID,
+                                     ELEVENLABS_VOICE_SETTINGS, limited_render)
+    return {"response": chatbot_text, "audio_url": audio_url(key)}
+
+
+# Function to stream a batch job's results as NDJSON, starting at completion position `start`
+def stream_batch(job, start=0):
+    yield json.dumps({"type": "job", **job.summary()}) + "\n"
+    for result in job.iter_results(start):
+        yield json.dumps({"type": "result", **result}) + "\n"
+    yield json.dumps({"type": "done", **job.summary()}) + "\n"
+
+
+# Function to split complete sentences off the front of a text buffer
+def split_sentences(buffer):
+    parts = SENTENCE_END.split(buffer)
+    sentences = [p.strip() for p in parts[:-1] if p.strip()]
+    return sentences, parts[-1]
+
+
+# Function to stream a chat reply as NDJSON events: text deltas as Chatbase sends them,
+# plus one audio event per sentence, synthesized while later sentences are still arriving
+def stream_chat(user_message, session_id, messages):
+    events = queue.Queue()
+    first_turn = len(messages) == 1  # caches only apply to questions asked without earlier context
+
+    def on_audio_done(index, sentence, future):
+        try:
+            events.put({"type": "audio", "index": index, "text": sentence, "audio_url": future.result()})
+        except Exception as e:
+            events.put({"type": "audio_error", "index": index, "text": sentence, "details": str(e)})
+
+    def submit_sentence(index, sentence):
+        future = tts_executor.submit(index, text_to_speech, sentence)  # first sentences jump the queue
+        future.add_done_callback(lambda f: on_audio_done(index, sentence, f))
+
+    # Chatbase streamed, hedged on its first chunk: if it is slow, failing or switched off by its
+    # breaker, the other providers answer instead (without asking Chatbase a second time)
+    def chatbase_chunks(messages):
+        start, sent = time.perf_counter(), False
+        try:
+            for chunk in upstream.chatbase_stream(messages):
+                if not sent:
+                    metrics.observe("chatbase_first_chunk", time.perf_counter() - start)
+                sent = True
+                yield chunk
+        finally:
+            metrics.observe("chatbase_stream", time.perf_counter() - start, sent)
+
+    def reply_chunks(messages):
+        return router.stream("chatbase", chatbase_chunks, messages)
+
+    def read_chatbase():
+        try:
+            cached_response = intent_engine.reply(user_message) or (first_turn and reply_cache.get(user_message))
+            if cached_response:
+                chunks = [cached_response]
+            elif first_turn:
+                # Learners asking the same question at once share one stream
+                chunks = reply_flight.stream(normalize(user_message), lambda: reply_chunks(messages))
+            else:
+                chunks = reply_chunks(messages)
+
+            buffer, count, full_text = "", 0, []
+            for chunk in chunks:
+                full_text.append(chunk)
+                events.put({"type": "text", "delta": chunk})
+                sentences, buffer = split_sentences(buffer + chunk)
+                for sentence in sentences:
+                    submit_sentence(count, sentence)
+                    count += 1
+
+            if buffer.strip():
+                submit_sentence(count, buffer.strip())
+                count += 1
+
+            if first_turn and not cached_response:
+                reply_cache.put(user_message, "".join(full_text))
+            if session_id:
+                sessions.append(session_id, user_message, "".join(full_text))
+            events.put({"type": "text_done", "segments": count})
+        except upstream.UpstreamError as e:
+            events.put({"type": "error", "error": "Chatbase API error", "details": e.details})
+        except AllProvidersFailed as e:
+            events.put({"type": "error", "error": "Chatbot API error", "details": e.errors})
+        except Exception as e:
+            events.put({"type": "error", "error": "Server error", "details": str(e)})
+
+    threading.Thread(target=read_chatbase, daemon=True).start()
+
+    full_text, segments, audio_done = [], None, 0
+    while segments is None or audio_done < segments:
+        event = events.get()
+
+        if event["type"] == "text_done":
+            segments = event["segments"]
+            continue
+        if event["type"] == "error":
+            yield json.dumps(event) + "\n"
+            return
+        if event["type"] == "text":
+            full_text.append(event["delta"])
+        else:
+            audio_done += 1
+
+        yield json.dumps(event) + "\n"
+
+    yield json.dumps({"type": "done", "response": "".join(full_text), "segments": segments,
+                      "session_id": session_id}) + "\n"
+
+
+# Function to check whether the client asked for a streamed reply
+def wants_stream():
+    if "application/x-ndjson" in request.headers.get("Accept", ""):
+        return True
+    return bool(request.json.get("stream"))
+
+
+@api.route("/chat", methods=["POST"])
 def chat():
     try:
         user_message = request.json.get("message")
         if not user_message:
             return jsonify({"error": "Message required"}), 400
 
-        # ✅ Send message to Chatbase
-        chatbase_headers = {"Authorization": f"Bearer {CHATBASE_API_KEY}", "Content-Type": "application/json"}
-        chatbase_data = {"messages": [{"role": "user", "content": user_message}], "chatbotId": CHATBASE_BOT_ID}
-        chatbase_response = requests.post("https://www.chatbase.co/api/v1/chat", headers=chatbase_headers, json=chatbase_data)
+        # ✅ Continue the caller's conversation, start one if asked ("new_session": true), or answer
+        # a one-off question without storing anything
+        session_id = request.json.get("session_id") or (uuid.uuid4().hex if request.json.get("new_session") else None)
+        messages = sessions.messages(session_id, user_message)
+        first_turn = len(messages) == 1
 
-        if chatbase_response.status_code != 200:
-            return jsonify({"error": "Chatbase API error", "details": chatbase_response.text}), chatbase_response.status_code
+        # ✅ Streaming mode: text and per-sentence audio as they become ready
+        if wants_stream():
+            return Response(stream_with_context(stream_chat(user_message, session_id, messages)),
+                            mimetype="application/x-ndjson",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-        chatbot_text = chatbase_response.json().get("text", "No response from Chatbase")
+        # ✅ Answer locally or from the reply cache, or ask Chatbase (OpenAI if Chatbase is slow or down)
+        with metrics.span("local_lookup"):
+            chatbot_text = intent_engine.reply(user_message) or (first_turn and reply_cache.get(user_message))
+        if not chatbot_text:
+            try:
+                with metrics.span("reply"):
+                    if first_turn:
+                        chatbot_text = reply_flight.do(normalize(user_message), lambda: fetch_reply(user_message))
+                    else:
+                        _, chatbot_text = router.call(messages)
+            except AllProvidersFailed as e:
+                return jsonify({"error": "Chatbot API error", "details": e.errors}), 502
+            except TimeoutError as e:
+                return jsonify({"error": "Chatbot API error", "details": str(e)}), 504
+        if session_id:
+            sessions.append(session_id, user_message, chatbot_text)
 
-        # ✅ Send text to ElevenLabs
-        elevenlabs_headers = {"xi-api-key": ELEVENLABS_API_KEY, "Content-Type": "application/json"}
-        elevenlabs_data = {
-            "text": chatbot_text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {"stability": 0.5, "similarity_boost": 0.8}
-        }
+        # ✅ Give the reply an audio URL; ElevenLabs streams it when the client first fetches it
+        key = tts_cache.register(chatbot_text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID, ELEVENLABS_VOICE_SETTINGS)
 
-        elevenlabs_response = requests.post(
-            f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}",
-            headers=elevenlabs_headers,
-            json=elevenlabs_data
-        )
+        return jsonify({"response": chatbot_text, "audio_url": audio_url(key), "session_id": session_id})
 
-        if elevenlabs_response.status_code != 200:
-            return jsonify({"error": "ElevenLabs API error", "details": elevenlabs_response.text}), elevenlabs_response.status_code
+    except Exception as e:
+        return jsonify({"error": "Server error", "details": str(e)}), 500
 
-        # ✅ Save audio file
-        audio_file_path = "static/chatbot_audio.mp3"
-        with open(audio_file_path, "wb") as f:
-            f.write(elevenlabs_response.content)
+# ✅ End a conversation: its history is forgotten and the session_id starts empty if used again
+@api.route("/chat/session/<session_id>", methods=["DELETE"])
+def end_session(session_id):
+    sessions.clear(session_id)
+    return "", 204
 
-        return jsonify({"response": chatbot_text, "audio_url": f"http://127.0.0.1:4000/static/chatbot_audio.mp3"})
 
-    except Exception as e:
-        return jsonify({"error": "Server error", "details": str(e)}), 500
+# ✅ Bulk lesson preparation: results stream back as NDJSON in the order they finish
+@api.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    messages = (request.get_json(silent=True) or {}).get("messages")
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, str) and m.strip() for m in messages):
+        return jsonify({"error": "messages must be a non-empty list of non-empty strings"}), 400
+    if len(messages) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {BATCH_MAX_ITEMS} messages per batch"}), 400
+
+    try:
+        job = batch_runner.submit(messages)
+    except TooManyJobs as e:
+        return jsonify({"error": "Too many batch jobs, try again later", "details": str(e)}), 429
+    return Response(stream_batch(job), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.id})
+
+
+# ✅ Resume a batch: results from position `after` on (the "seq" of the last result received + 1)
+@api.route("/chat/batch/<job_id>")
+def chat_batch_resume(job_id):
+    job = batch_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    start = request.args.get("after", 0, type=int)
+    if start < 0:
+        return jsonify({"error": "after must be 0 or more"}), 400
+    return Response(stream_batch(job, start), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.id})
 
-@app.route("/static/<filename>")
+
+# ✅ Per-request timing: spans are collected while handling the request and sent back as Server-Timing
+@api.before_app_request
+def start_timing():
+    request.start_time = time.perf_counter()
+    metrics.start_request()
+
+
+@api.after_app_request
+def add_server_timing(response):
+    start = request.start_time
+    elapsed = time.perf_counter() - start
+    timing = metrics.server_timing()
+    endpoint = str(request.endpoint).rpartition(".")[2]  # "api.chat" -> "chat"
+    body = (request.get_json(silent=True) or {}) if endpoint == "chat" else {}
+
+    # A streamed body (NDJSON /chat, batches, /audio) is generated after this runs: its headers can
+    # only carry the time to headers, and the request is recorded once the body has been sent
+    if response.is_streamed:
+        response.headers["Server-Timing"] = (timing + ", " if timing else "") + f"headers;dur={elapsed * 1000:.1f}"
+        response.call_on_close(lambda: record_request(endpoint, body, response, time.perf_counter() - start))
+        return response
+
+    if timing:
+        response.headers["Server-Timing"] = timing + f", total;dur={elapsed * 1000:.1f}"
+    record_request(endpoint, body, response, elapsed)
+    return response
+
+
+# Function to record a finished request's latency, and log it if it was a /chat call
+def record_request(endpoint, body, response, elapsed):
+    metrics.observe(f"http_{endpoint}", elapsed, response.status_code < 500)
+    if endpoint == "chat":
+        request_log.log({
+            "ts": time.time(),
+            "message": body.get("message"),
+            "stream": response.mimetype == "application/x-ndjson",
+            "status": response.status_code,
+            "latency_ms": round(elapsed * 1000, 1),
+        })
+
+
+# ✅ Liveness: the process is up and serving requests
+@api.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# ✅ Readiness: caches are loaded and upstream connections are open
+@api.route("/readyz")
+def readyz():
+    if not ready.is_set():
+        return jsonify({"status": "warming_up", "warmup": warmup_report}), 503
+    return jsonify({"status": "ready", "warmup": warmup_report})
+
+
+@api.route("/metrics")
+def prometheus_metrics():
+    gauges = {}
+    for name, value in tts_cache.stats().items():
+        gauges[f"tts_cache_{name}"] = value
+    for name, value in reply_cache.stats().items():
+        gauges[f"reply_cache_{name}"] = value
+    for name, value in sessions.backend.stats().items():
+        gauges[f"session_{name}"] = value
+    for name, value in reply_flight.stats().items():
+        gauges[f"reply_coalesce_{name}"] = value
+    for name, value in tts_cache.flight.stats().items():
+        gauges[f"tts_coalesce_{name}"] = value
+    for name, value in batch_runner.stats().items():
+        gauges[f"batch_{name}"] = value
+    for provider, stats in router.stats().items():
+        gauges[f"provider_{provider}_open"] = int(stats["state"] == "open")
+        gauges[f"provider_{provider}_error_rate"] = stats["error_rate"]
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+# ✅ Audio for a reply: finished files are served with Range and ETag support and cached forever,
+# new ones are streamed from ElevenLabs to the client and to disk at the same time
+@api.route("/audio/<key>.mp3")
+def stream_audio(key):
+    if not AUDIO_KEY.fullmatch(key):
+        return jsonify({"error": "Audio not found"}), 404
+
+    path = tts_cache.get(key)
+    if path is None:
+        chunks = tts_cache.stream(key, render_speech)
+        if chunks is None:
+            return jsonify({"error": "Audio not found"}), 404
+        try:
+            first = next(chunks, b"")  # surface ElevenLabs errors before sending a 200
+        except upstream.UpstreamError as e:
+            return jsonify({"error": "ElevenLabs API error", "details": e.details}), e.status_code or 502
+        except TimeoutError as e:  # the render stopped sending audio
+            return jsonify({"error": "ElevenLabs API error", "details": str(e)}), 504
+        except OSError as e:  # the render failed and left no file behind
+            return jsonify({"error": "Audio render failed", "details": str(e)}), 502
+        return Response(chain([first], chunks), mimetype="audio/mpeg",
+                        headers={"Cache-Control": "no-cache"})
+
+    response = send_file(os.path.abspath(path), mimetype="audio/mpeg", conditional=True, etag=key,
+                         max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@api.route("/static/<filename>")
 def serve_audio(filename):
     return send_from_directory("static", filename)
 
+
+# ✅ `chatbot_api.app` still works (e.g. `gunicorn chatbot_api:app`): the app is built on first access
+def __getattr__(name):
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if "app" not in globals():
+            globals()["app"] = create_app()
+    return globals()["app"]
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=4000)
+    create_app().run(host="0.0.0.0", port=4000)
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import stubs
+import upstream
+
+# ✅ test_chatbase.py and test_openai.py are scripts that call the live APIs, not pytest tests
+collect_ignore = ["test_chatbase.py", "test_openai.py"]
+
+
+# ✅ Local Chatbase, OpenAI and ElevenLabs stubs, shared by every test that talks to the app
+@pytest.fixture(scope="session")
+def stub_servers():
+    running = stubs.start_stubs(chatbase={"latency": 0.02, "jitter": 0}, openai={"latency": 0.02, "jitter": 0},
+                                elevenlabs={"latency": 0.02, "jitter": 0})
+    yield running
+    for stub in running.values():
+        stub.stop()
+
+
+# ✅ The Flask app against the stubs, in a scratch directory, built once per test session
+@pytest.fixture(scope="session")
+def app(stub_servers, tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    os.environ.update(stubs.env(stub_servers))
+    os.environ["REQUEST_LOG_PATH"] = ""
+    upstream.close()  # clients built by earlier tests may point at the real APIs
+
+    import chatbot_api
+    chatbot_api.WARMUP_PROVIDERS = []
+    yield chatbot_api.create_app()
+    upstream.close()
+    os.chdir(cwd)
+
+
+# ✅ A test client with fresh caches and router, so breakers and cached replies don't leak between tests
+@pytest.fixture
+def client(app, stub_servers, tmp_path, monkeypatch):
+    import chatbot_api
+    from tts_cache import TTSCache
+    from reply_cache import ReplyCache
+    from singleflight import Group
+    from provider_router import make_chat_router
+
+    monkeypatch.setattr(chatbot_api, "tts_cache", TTSCache(str(tmp_path / "tts")))
+    monkeypatch.setattr(chatbot_api, "reply_cache", ReplyCache())
+    monkeypatch.setattr(chatbot_api, "reply_flight", Group())
+    monkeypatch.setattr(chatbot_api, "router", make_chat_router())
+    yield app.test_client()
+    for stub in stub_servers.values():
+        stub.error_rate = 0.0
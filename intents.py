@@ -0,0 +1,124 @@
+import os
+import re
+import json
+from collections import deque
+
+# ✅ Local intent engine for canned answers (greetings, name, small talk).
+# Rules come from intents.json and are compiled into an Aho-Corasick automaton over words,
+# so matching is one pass over the message and "hi" never matches inside "this" or "which".
+# A canned answer is only used for small talk itself, never for a question about the phrase.
+
+INTENTS_PATH = os.getenv("INTENTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json"))
+
+# Share of the message's words the matched phrases must cover before we answer locally,
+# so "hi, how do I use the past perfect?" still goes to the real chatbot
+INTENT_MIN_COVERAGE = float(os.getenv("INTENT_MIN_COVERAGE", "0.5"))
+
+# A word, with apostrophes only inside it ("how's", not the quotes around 'hello')
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*", re.IGNORECASE)
+
+# A quoted phrase: "...", “...”, ‘...’ or '...' (a ' inside a word like "it's" doesn't open one)
+QUOTED = re.compile(r"\"[^\"]*\"|“[^”]*”|‘[^’]*’|(?<!\w)'.+?'(?!\w)")
+
+# Words that may surround an intent phrase without changing what the learner means.
+# Any other word left over ("what does ... mean", "is ... correct") sends the message upstream,
+# since a question about a phrase is exactly what the tutor is for.
+FILLERS = frozenset(
+    "oh ah ok okay well so um uh er and again too very much please today chatty bot buddy friend my dear".split()
+)
+
+
+# Function to split text into lowercase words
+def tokenize(text):
+    return [word.lower() for word in WORD.findall(text)]
+
+
+class IntentEngine:
+    def __init__(self, rules):
+        self.rules = rules  # [{"name", "patterns", "response"}], earlier rules win ties
+        self._goto = [{}]  # state -> {word: next state}
+        self._fail = [0]
+        self._output = [[]]  # state -> [(pattern length, rule index)] ending here
+        self._build()
+
+    @classmethod
+    def from_file(cls, path=INTENTS_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _build(self):
+        for index, rule in enumerate(self.rules):
+            for pattern in rule["patterns"]:
+                words = tokenize(pattern)
+                if not words:
+                    continue
+                state = 0
+                for word in words:
+                    if word not in self._goto[state]:
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append([])
+                        self._goto[state][word] = len(self._goto) - 1
+                    state = self._goto[state][word]
+                self._output[state].append((len(words), index))
+
+        # Breadth-first pass to fill failure links and merge outputs of suffix states
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    # Function to run the automaton over a message, returns (words, matches) where each match is
+    # (start word, end word, rule index) and `words` are (word, start char, end char)
+    def _scan(self, text):
+        words = [(m.group().lower(), m.start(), m.end()) for m in WORD.finditer(text)]
+        matches = []
+        state = 0
+        for position, (word, _, _) in enumerate(words):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for length, index in self._output[state]:
+                matches.append((position + 1 - length, position + 1, index))
+        return words, matches
+
+    # Function to pick the longest match; ties go to the rule listed first, then to the earliest
+    @staticmethod
+    def _best(matches):
+        return max(matches, key=lambda found: (found[1] - found[0], -found[2], -found[0]))
+
+    # Function to find the best rule in a message, returns (rule, coverage) or None.
+    # Coverage is the share of the message's words that are part of a matched phrase.
+    def match(self, text):
+        words, matches = self._scan(text)
+        if not matches:
+            return None
+        covered = {position for start, end, _ in matches for position in range(start, end)}
+        return self.rules[self._best(matches)[2]], len(covered) / len(words)
+
+    # Function to get a canned answer for a message, or None if it should go upstream.
+    # Answered locally only when every word is part of a matched phrase or a filler, and, unless
+    # the phrase is the whole message, the phrase isn't quoted: 'What does "see you later" mean?'
+    # and 'Is "how are you" correct?' are questions about English, not small talk.
+    def reply(self, text, min_coverage=INTENT_MIN_COVERAGE):
+        words, matches = self._scan(text)
+        if not matches:
+            return None
+        covered = {position for start, end, _ in matches for position in range(start, end)}
+        if len(covered) / len(words) < min_coverage:
+            return None
+        if any(word not in FILLERS for position, (word, _, _) in enumerate(words) if position not in covered):
+            return None
+
+        start, end, index = self._best(matches)
+        if (start, end) != (0, len(words)):
+            first, last = words[start][1], words[end - 1][2]
+            if any(quote.start() < last and first < quote.end() for quote in QUOTED.finditer(text)):
+                return None
+        return self.rules[index]["response"]
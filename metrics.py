@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# ✅ Lightweight per-stage timing.
+# span("chatbase") times a block; each stage keeps a count, error count, total time and a bounded
+# window of recent samples for p50/p95/p99. render() prints everything in Prometheus text format,
+# and the spans of the current request can be turned into a Server-Timing header.
+# METRICS_SAMPLE_RATE=0 turns timing off, 0.1 times one request in ten.
+
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1"))
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Spans of the request being handled: a list when sampled, False when not sampled,
+# None outside a request (background work then samples span by span)
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Stage:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=METRICS_WINDOW)
+
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+
+
+def _sampled():
+    return METRICS_SAMPLE_RATE >= 1 or random.random() < METRICS_SAMPLE_RATE
+
+
+# Function to record a timing for a stage
+def observe(stage, seconds, ok=True):
+    spans = _request_spans.get()
+    if spans is False or (spans is None and not _sampled()):
+        return
+
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = Stage()
+        entry.count += 1
+        entry.total += seconds
+        entry.samples.append(seconds)
+        if not ok:
+            entry.errors += 1
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+# Function to add to a counter (e.g. bytes of audio produced)
+def inc(name, value=1):
+    if METRICS_SAMPLE_RATE <= 0:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one observation of `stage`; exceptions count as errors."""
+    if METRICS_SAMPLE_RATE <= 0:
+        yield
+        return
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(stage, time.perf_counter() - start, ok)
+
+
+# Function to start collecting spans for a new request (decides whether it is sampled)
+def start_request():
+    _request_spans.set([] if METRICS_SAMPLE_RATE > 0 and _sampled() else False)
+
+
+# Function to build the Server-Timing header value for the current request, or None
+def server_timing():
+    spans = _request_spans.get()
+    if not spans:
+        return None
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans)
+
+
+# Function to render all stages, counters and the given gauges in Prometheus text format
+def render(gauges=None):
+    with _lock:
+        stages = {name: (s.count, s.errors, s.total, sorted(s.samples)) for name, s in _stages.items()}
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP chatbot_stage_seconds Time spent per stage (quantiles over recent samples).",
+        "# TYPE chatbot_stage_seconds summary",
+    ]
+    for name, (count, _, total, samples) in sorted(stages.items()):
+        for q in QUANTILES:
+            if samples:
+                value = samples[min(len(samples) - 1, int(q * len(samples)))]
+                lines.append(f'chatbot_stage_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+        lines.append(f'chatbot_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'chatbot_stage_seconds_count{{stage="{name}"}} {count}')
+
+    lines += ["# HELP chatbot_stage_errors_total Failed calls per stage.", "# TYPE chatbot_stage_errors_total counter"]
+    for name, (_, errors, _, _) in sorted(stages.items()):
+        lines.append(f'chatbot_stage_errors_total{{stage="{name}"}} {errors}')
+
+    for name, value in sorted(counters.items()):
+        lines += [f"# TYPE chatbot_{name}_total counter", f"chatbot_{name}_total {value}"]
+
+    for name, value in sorted((gauges or {}).items()):
+        lines += [f"# TYPE chatbot_{name} gauge", f"chatbot_{name} {value}"]
+
+    return "\n".join(lines) + "\n"
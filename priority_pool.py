@@ -0,0 +1,43 @@
+import queue
+import itertools
+import threading
+from concurrent.futures import Future
+
+# ✅ Thread pool that runs queued calls lowest priority first (FIFO among equals).
+# Used for per-sentence speech synthesis in streamed replies: with the sentence index as the
+# priority, the first sentence of a new reply never waits behind the later sentences of replies
+# that started earlier, so time to first audio doesn't grow with the number of concurrent replies.
+
+
+class PriorityPool:
+    def __init__(self, workers, name="priority-pool"):
+        self.workers = workers
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()  # FIFO among calls with the same priority
+        self._threads = []
+        self._lock = threading.Lock()
+
+    # Function to queue fn(*args) with a priority (lower runs first), returns a Future
+    def submit(self, priority, fn, *args):
+        future = Future()
+        self._queue.put((priority, next(self._order), future, fn, args))
+        with self._lock:
+            if len(self._threads) < self.workers:  # threads are started as work arrives
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        return future
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            _, _, future, fn, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
@@ -0,0 +1,271 @@
+import os
+import time
+import queue
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import upstream
+import metrics
+
+# ✅ Routes a chat request across providers (Chatbase first, OpenAI second).
+# Hedging: if the primary has not answered within ROUTER_HEDGE_AFTER seconds, the secondary is
+# started as well and whichever answers first wins. A provider that fails is not waited on.
+# Circuit breaker: a provider with too many recent errors is skipped for BREAKER_COOLDOWN seconds,
+# then gets a single trial call before it is used normally again.
+# Streaming: stream() hedges a streamed reply on its time to first chunk the same way, falling
+# back to the other providers (never the same one again) if it is slow or fails before sending.
+
+ROUTER_HEDGE_AFTER = float(os.getenv("ROUTER_HEDGE_AFTER", "2.5"))
+ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT", "45"))
+ROUTER_WORKERS = int(os.getenv("ROUTER_WORKERS", "32"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+OPENAI_SYSTEM_PROMPT = "You are a helpful assistant for English learners."
+
+
+class AllProvidersFailed(Exception):
+    """No provider produced a reply (all failed, timed out or are switched off by their breaker)."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors.items()) or "no provider available")
+        self.errors = errors
+
+
+class ProviderHealth:
+    """Rolling latency/error window and circuit breaker state for one provider."""
+
+    def __init__(self, window=BREAKER_WINDOW):
+        self._calls = deque(maxlen=window)  # (latency seconds, ok)
+        self._lock = threading.Lock()
+        self.open_until = 0.0
+        self.trial_in_flight = False
+
+    # Function to check (and claim a half-open trial slot) before calling the provider
+    def allow(self):
+        with self._lock:
+            if not self.open_until:
+                return True
+            if time.monotonic() < self.open_until or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._calls.append((latency, ok))
+            if self.trial_in_flight:
+                self.trial_in_flight = False
+                if ok:
+                    self.open_until = 0.0
+                    self._calls.clear()
+                    self._calls.append((latency, ok))
+                else:
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+                return
+
+            errors = sum(1 for _, call_ok in self._calls if not call_ok)
+            if len(self._calls) >= BREAKER_MIN_CALLS and errors / len(self._calls) >= BREAKER_ERROR_RATE:
+                self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(latency for latency, _ in self._calls)
+            errors = sum(1 for _, ok in self._calls if not ok)
+            if not self.open_until:
+                state = "closed"
+            elif time.monotonic() < self.open_until:
+                state = "open"
+            else:
+                state = "half_open"
+            return {
+                "state": state,
+                "calls": len(latencies),
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            }
+
+
+class ProviderRouter:
+    def __init__(self, providers, hedge_after=ROUTER_HEDGE_AFTER, timeout=ROUTER_TIMEOUT, executor=None):
+        self.providers = providers  # [(name, fn)] in order of preference
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.health = {name: ProviderHealth() for name, _ in providers}
+        self._executor = executor or ThreadPoolExecutor(max_workers=ROUTER_WORKERS)
+
+    # Function to check whether a provider may be called now (claims the trial call when half-open)
+    def allow(self, name):
+        return self.health[name].allow()
+
+    def record(self, name, latency, ok):
+        self.health[name].record(latency, ok)
+
+    def stats(self):
+        return {name: health.snapshot() for name, health in self.health.items()}
+
+    def _run(self, name, fn, args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.record(name, time.perf_counter() - start, False)
+            raise
+        ok = bool(result)
+        self.record(name, time.perf_counter() - start, ok)
+        if not ok:
+            raise upstream.UpstreamError(name, 0, "empty reply")
+        return result
+
+    # Function to get a reply, returns (provider name, result); providers in `exclude` are skipped
+    def call(self, *args, exclude=()):
+        waiting = [(name, fn) for name, fn in self.providers if name not in exclude]
+        errors = {}
+        running = {}
+        deadline = time.monotonic() + self.timeout
+
+        # Start the next provider whose breaker lets it through
+        def start_next():
+            while waiting:
+                name, fn = waiting.pop(0)
+                if self.health[name].allow():
+                    context = contextvars.copy_context()  # keeps the request's timing spans
+                    running[self._executor.submit(context.run, self._run, name, fn, args)] = name
+                    return
+                errors[name] = "circuit open"
+
+        start_next()
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # Wait for an answer, but only up to the hedge point if there is another provider to try
+            wait_for = deadline - now
+            if waiting:
+                wait_for = min(wait_for, self.hedge_after)
+
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    return name, future.result()
+                except Exception as e:
+                    errors[name] = str(e)
+
+            # Hedge on a slow provider, or move on right away after a failure
+            if waiting and (not done or not running):
+                start_next()
+
+        for name in running.values():
+            errors[name] = "timed out"
+        raise AllProvidersFailed(errors)
+
+    # Function to stream a reply from provider `name` with chunks_fn(*args), yielding text chunks.
+    # If no chunk has arrived after hedge_after seconds, call() on the other providers runs as well
+    # and whichever produces text first is used; a stream that fails before its first chunk falls
+    # back to them too. Once the stream has sent a chunk it is used to the end.
+    def stream(self, name, chunks_fn, *args):
+        if not self.health[name].allow():
+            yield self.call(*args, exclude={name})[1]
+            return
+
+        events = queue.Queue()
+        abandoned = threading.Event()
+
+        def read():
+            start, sent, ok = time.perf_counter(), False, False
+            chunks = chunks_fn(*args)
+            try:
+                for chunk in chunks:
+                    sent = True
+                    events.put(("chunk", chunk))
+                    if abandoned.is_set():  # the fallback won, or the client went away
+                        break
+                ok = sent
+                events.put(("end", None) if sent else ("error", upstream.UpstreamError(name, 0, "empty reply")))
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()  # releases the connection and concurrency slot
+                self.record(name, time.perf_counter() - start, ok)
+
+        def fallback():
+            try:
+                events.put(("fallback", self.call(*args, exclude={name})[1]))
+            except Exception as e:
+                events.put(("fallback_error", e))
+
+        def start_fallback():
+            context = contextvars.copy_context()
+            self._executor.submit(context.run, fallback)
+
+        context = contextvars.copy_context()  # keeps the request's timing spans
+        threading.Thread(target=context.run, args=(read,), daemon=True).start()
+
+        deadline = time.monotonic() + self.timeout
+        stream_failed = fallback_failed = fallback_started = False
+        errors = {}
+        try:
+            while True:
+                wait_for = deadline - time.monotonic()
+                if not fallback_started:
+                    wait_for = min(wait_for, self.hedge_after)
+                try:
+                    kind, value = events.get(timeout=max(0.0, wait_for))
+                except queue.Empty:
+                    if fallback_started:
+                        raise AllProvidersFailed({**errors, name: "timed out"})
+                    fallback_started = True
+                    start_fallback()
+                    continue
+
+                if kind == "chunk":
+                    break
+                if kind == "fallback":
+                    yield value
+                    return
+                if kind == "error":
+                    stream_failed = True
+                    errors[name] = str(value)
+                    if not fallback_started:
+                        fallback_started = True
+                        start_fallback()
+                elif kind == "fallback_error":
+                    fallback_failed = True
+                    errors.update(value.errors if isinstance(value, AllProvidersFailed) else {"fallback": str(value)})
+                if stream_failed and fallback_failed:
+                    raise AllProvidersFailed(errors)
+
+            # The stream answered first: use it to the end
+            yield value
+            while True:
+                kind, value = events.get(timeout=self.timeout)
+                if kind == "chunk":
+                    yield value
+                elif kind == "end":
+                    return
+                elif kind == "error":
+                    raise value
+        except queue.Empty:
+            raise AllProvidersFailed({name: "timed out"}) from None
+        finally:
+            abandoned.set()
+
+
+# Function to build the standard Chatbase -> OpenAI chat router; call(messages) returns (provider, text)
+def make_chat_router(bot_id=None):
+    def chatbase(messages):
+        with metrics.span("chatbase"):
+            return upstream.chatbase_chat(messages, bot_id=bot_id)
+
+    def openai(messages):
+        with metrics.span("openai"):
+            return upstream.openai_chat([{"role": "system", "content": OPENAI_SYSTEM_PROMPT}] + messages)
+
+    return ProviderRouter([("chatbase", chatbase), ("openai", openai)])
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# ✅ Replay load generator: sends the /chat calls recorded in a request log to the Flask app at a
+# target rate and concurrency, then reports throughput and latency percentiles. Each reply's audio
+# is fetched as well (from the stream's audio events, or the audio_url of a plain reply), so
+# ElevenLabs and the speech cache are part of the load; --no-audio leaves them out.
+# Latency is measured from each request's scheduled send time, so requests that had to wait for a
+# free worker count their wait (no coordinated omission); the lag behind schedule is reported too.
+# By default the app runs in this process against the local stubs from stubs.py, so nothing
+# leaves the machine; --url sends the requests to a running server instead.
+#
+#   python replay.py logs/requests.jsonl --qps 20 --concurrency 8 --count 500
+#   python replay.py logs/requests.jsonl --chatbase-latency 3 --hedge-after 1   # Chatbase brownout
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay logged /chat requests and report latency.")
+    parser.add_argument("log", help="JSONL request log (see request_log.py)")
+    parser.add_argument("--qps", type=float, default=10, help="target requests per second (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at most")
+    parser.add_argument("--count", type=int, default=0, help="requests to send (default: every logged request once)")
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app with stubs")
+    parser.add_argument("--cold", action="store_true", help="turn the reply and speech caches off")
+    parser.add_argument("--chatbase-latency", type=float, default=0.8)
+    parser.add_argument("--openai-latency", type=float, default=1.2)
+    parser.add_argument("--elevenlabs-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls that fail")
+    parser.add_argument("--hedge-after", type=float, help="override ROUTER_HEDGE_AFTER")
+    parser.add_argument("--no-audio", action="store_true", help="don't fetch the audio of each reply")
+    return parser.parse_args()
+
+
+# Function to get the events carrying an audio_url from a line of a /chat response
+def reply_events(line):
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return []
+    return [event] if isinstance(event, dict) and event.get("audio_url") else []
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+# Function to set up the in-process app against stubs; returns (send function, cleanup function)
+def local_target(args):
+    import stubs
+
+    running = stubs.start_stubs(
+        chatbase={"latency": args.chatbase_latency, "jitter": args.chatbase_latency / 4, "error_rate": args.error_rate},
+        openai={"latency": args.openai_latency, "jitter": args.openai_latency / 4, "error_rate": args.error_rate},
+        elevenlabs={"latency": args.elevenlabs_latency, "jitter": args.elevenlabs_latency / 4,
+                    "error_rate": args.error_rate},
+    )
+    os.environ.update(stubs.env(running))
+    os.environ["REQUEST_LOG_PATH"] = ""  # don't append the replay to the log being replayed
+    tts_dir = os.path.join("cache", f"tts_replay_{os.getpid()}")
+    os.environ["TTS_CACHE_DIR"] = tts_dir
+    if args.cold:
+        os.environ["REPLY_CACHE_TTL"] = "0"
+        os.environ["TTS_CACHE_MAX_BYTES"] = "0"
+    if args.hedge_after is not None:
+        os.environ["ROUTER_HEDGE_AFTER"] = str(args.hedge_after)
+
+    import chatbot_api
+
+    app = chatbot_api.create_app()
+    clients = threading.local()
+
+    def send(record, start):
+        client = getattr(clients, "client", None)
+        if client is None:
+            client = clients.client = app.test_client()
+        response = client.post("/chat", json={"message": record["message"], "stream": record.get("stream", False)},
+                               buffered=False)
+        first_audio, audio_urls = None, []
+        for line in response.response:
+            if first_audio is None and b'"type": "audio"' in line:
+                first_audio = time.perf_counter() - start
+            audio_urls += [event["audio_url"] for event in reply_events(line)]
+        response.close()
+
+        # A plain reply only carries the audio URL; the audio is rendered when it is fetched
+        if not args.no_audio and response.status_code == 200:
+            for url in audio_urls if record.get("stream") else audio_urls[:1]:
+                audio = client.get(urlsplit(url).path, buffered=False)
+                for _ in audio.response:
+                    if first_audio is None:
+                        first_audio = time.perf_counter() - start
+                audio.close()
+        return response.status_code, time.perf_counter() - start, first_audio
+
+    def cleanup():
+        for stub in running.values():
+            stub.stop()
+        shutil.rmtree(tts_dir, ignore_errors=True)
+
+    return send, cleanup
+
+
+# Function to send requests to a running server over HTTP; returns (send function, cleanup function)
+def remote_target(args):
+    import httpx
+
+    client = httpx.Client(base_url=args.url, timeout=120, limits=httpx.Limits(max_connections=args.concurrency))
+
+    def send(record, start):
+        first_audio, audio_urls = None, []
+        data = {"message": record["message"], "stream": record.get("stream", False)}
+        with client.stream("POST", "/chat", json=data) as response:
+            for line in response.iter_lines():
+                if first_audio is None and '"type": "audio"' in line:
+                    first_audio = time.perf_counter() - start
+                audio_urls += [event["audio_url"] for event in reply_events(line)]
+
+        if not args.no_audio and response.status_code == 200:
+            for url in audio_urls if record.get("stream") else audio_urls[:1]:
+                with client.stream("GET", url) as audio:
+                    for _ in audio.iter_bytes():
+                        if first_audio is None:
+                            first_audio = time.perf_counter() - start
+        return response.status_code, time.perf_counter() - start, first_audio
+
+    return send, client.close
+
+
+def main():
+    args = parse_args()
+    # The target first: local_target() sets the environment (REQUEST_LOG_PATH="" among it) before
+    # any module of the app is imported, so the replay isn't appended to the log being read
+    send, cleanup = remote_target(args) if args.url else local_target(args)
+    from request_log import read_log
+
+    records = [r for r in read_log(args.log) if r.get("message")]
+    if not records:
+        cleanup()
+        sys.exit(f"No /chat requests with a message in {args.log}")
+    count = args.count or len(records)
+
+    results = []
+    lock = threading.Lock()
+
+    # Latency counts from when the request was due, not from when a worker got to it: if the app
+    # falls behind, the time a request waited for a free worker is part of what its user saw
+    def run(i, due):
+        lag = time.perf_counter() - due
+        try:
+            status, latency, first_audio = send(records[i % len(records)], due)
+        except Exception as e:
+            status, latency, first_audio = f"error: {type(e).__name__}", None, None
+        with lock:
+            results.append((status, latency, first_audio, lag))
+
+    # Open loop: request i is due at start + i / qps, however long earlier requests take
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(count):
+            due = time.perf_counter()
+            if args.qps > 0:
+                due = started + i / args.qps
+                time.sleep(max(0.0, due - time.perf_counter()))
+            pool.submit(run, i, due)
+    elapsed = time.perf_counter() - started
+    cleanup()
+
+    latencies = sorted(latency for status, latency, _, _ in results if status == 200)
+    first_audio = sorted(value for status, _, value, _ in results if status == 200 and value is not None)
+    lags = sorted(lag for _, _, _, lag in results)
+    statuses = {}
+    for status, _, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"requests:   {len(results)} in {elapsed:.2f}s, target {args.qps:g} req/s")
+    print(f"throughput: {len(results) / elapsed:.1f} req/s achieved, {len(latencies) / elapsed:.1f} req/s answered with 200")
+    print("send lag:   p50 {:.0f} ms, p95 {:.0f} ms, max {:.0f} ms behind schedule".format(
+        *(percentile(lags, q) * 1000 for q in (0.5, 0.95)), lags[-1] * 1000))
+    print(f"status:     {json.dumps(statuses)}")
+    if latencies:
+        print("latency:    p50 {:.0f} ms, p95 {:.0f} ms, p99 {:.0f} ms, max {:.0f} ms".format(
+            *(percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99)), latencies[-1] * 1000))
+    if args.no_audio:
+        print("audio:      not fetched (--no-audio), ElevenLabs and the speech cache are not exercised")
+    if first_audio:
+        print("first audio: p50 {:.0f} ms, p95 {:.0f} ms".format(
+            *(percentile(first_audio, q) * 1000 for q in (0.5, 0.95))))
+
+
+if __name__ == "__main__":
+    main()
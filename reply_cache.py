@@ -0,0 +1,105 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# ✅ Cache of chatbot replies keyed by the learner's question.
+# Exact tier: normalized text -> reply, with a TTL and LRU bound.
+# Near-duplicate tier (off by default): a question reuses the reply of a cached question that has
+# the same words in the same order once greetings and politeness words are left out, so
+# "Hi, what is a noun? Thanks" gets the reply to "What is a noun?". It is one dict lookup; there is
+# no fuzzy matching, since for a language tutor a one-word difference ("swim" / "swing",
+# "was and were" / "is and are") is usually the whole question.
+
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", "3600"))
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "5000"))
+REPLY_CACHE_NEAR = os.getenv("REPLY_CACHE_NEAR", "0") == "1"  # 1 turns the near-duplicate tier on
+
+NON_WORD = re.compile(r"[^\w']+")
+
+# Words that don't change what is being asked, left out when comparing near-duplicate questions.
+# Only greetings and politeness: articles, auxiliaries and modals are often what the question is about.
+FILLERS = frozenset("please pls hi hello hey thanks thank ok okay um uh oh".split())
+
+
+# Function to normalize a question: lowercase, no punctuation, single spaces
+def normalize(text):
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+# Function to get the words of a normalized question that carry its meaning, in order
+def content_words(key):
+    return tuple(word for word in key.split() if word not in FILLERS)
+
+
+class ReplyCache:
+    def __init__(self, ttl=REPLY_CACHE_TTL, max_entries=REPLY_CACHE_MAX_ENTRIES, near=REPLY_CACHE_NEAR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near = near
+        self._entries = OrderedDict()  # normalized question -> (reply, expires_at), oldest first
+        self._by_words = {}  # content words -> normalized question most recently stored with them
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    # Function to find a cached reply for a question, returns None on a miss
+    def get(self, message):
+        if self.max_entries <= 0:
+            return None
+        key = normalize(message)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            near_key = self._by_words.get(content_words(key)) if self.near else None
+            if near_key is not None:
+                near = self._entries[near_key]
+                if near[1] > now:
+                    self._entries.move_to_end(near_key)
+                    self.near_hits += 1
+                    return near[0]
+                self._remove(near_key)
+
+            self.misses += 1
+            return None
+
+    # Function to remember the reply to a question
+    def put(self, message, reply):
+        key = normalize(message)
+        if not key or not reply or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = (reply, time.monotonic() + self.ttl)
+            if self.near:
+                self._by_words[content_words(key)] = key
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key):
+        del self._entries[key]
+        words = content_words(key)
+        if self._by_words.get(words) == key:
+            del self._by_words[words]
@@ -0,0 +1,109 @@
+import os
+import json
+import queue
+import threading
+
+# ✅ Append-only JSONL log of /chat calls, written by a background thread.
+# Requests only put a record on a bounded queue; the writer thread batches records into one
+# write, and rotates the file (requests.jsonl -> requests.jsonl.1 -> ...) once it passes max_bytes.
+# Set REQUEST_LOG_PATH to an empty string to turn logging off.
+
+REQUEST_LOG_PATH = os.getenv("REQUEST_LOG_PATH", os.path.join("logs", "requests.jsonl"))
+REQUEST_LOG_MAX_BYTES = int(os.getenv("REQUEST_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+REQUEST_LOG_BACKUPS = int(os.getenv("REQUEST_LOG_BACKUPS", "5"))
+REQUEST_LOG_BATCH = int(os.getenv("REQUEST_LOG_BATCH", "256"))
+REQUEST_LOG_FLUSH_SECONDS = float(os.getenv("REQUEST_LOG_FLUSH_SECONDS", "1"))
+
+
+class RequestLog:
+    def __init__(self, path=REQUEST_LOG_PATH, max_bytes=REQUEST_LOG_MAX_BYTES, backups=REQUEST_LOG_BACKUPS,
+                 batch_size=REQUEST_LOG_BATCH, flush_seconds=REQUEST_LOG_FLUSH_SECONDS, queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+            self._thread.start()
+
+    # Function to queue one record; never blocks the request (records are dropped if the writer is behind)
+    def log(self, record):
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # Function to write everything queued so far and stop the writer
+    def close(self, timeout=5):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+
+            batch, stop = [], record is None
+            if not stop:
+                batch.append(record)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                else:
+                    batch.append(record)
+
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self.written += len(batch)
+        except OSError:
+            self.dropped += len(batch)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+# Function to read records back from a log file (skips lines that are not valid JSON)
+def read_log(path):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
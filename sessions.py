@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# ✅ Multi-turn conversation memory with a bounded size.
+# Each session is stored as one compact JSON blob: {"s": summary, "t": [["u", text], ["a", text], ...]}.
+# After every turn the oldest turns are dropped until the history fits SESSION_TOKEN_BUDGET, and
+# (unless SESSION_SUMMARY_TOKENS is 0) the first sentence of each dropped turn is folded into a
+# short rolling summary, so the prompt sent upstream stays the same size however long a lesson runs.
+# Backends: "memory" (per process, LRU + TTL + byte cap) or "sqlite" (a local file shared by
+# all gunicorn workers), chosen with SESSION_BACKEND.
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "1500"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "200"))
+
+ROLES = {"u": "user", "a": "assistant"}
+UPSERT = ("INSERT INTO sessions (id, data, updated) VALUES (?, ?, ?) "
+          "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated = excluded.updated")
+FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.S)
+
+
+# Function to estimate the tokens in a text (about four characters per token for English)
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class MemoryBackend:
+    """Sessions in this process only, least recently used dropped first past max_bytes."""
+
+    def __init__(self, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # session id -> (blob, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._delete(session_id)
+                return None
+            self._data.move_to_end(session_id)
+            return entry[0]
+
+    def set(self, session_id, blob):
+        with self._lock:
+            self._set(session_id, blob)
+
+    # Function to replace a session's blob with fn(current blob or None) in one step
+    def update(self, session_id, fn):
+        with self._lock:
+            entry = self._data.get(session_id)
+            self._set(session_id, fn(entry[0] if entry is not None and entry[1] > time.monotonic() else None))
+
+    def delete(self, session_id):
+        with self._lock:
+            if session_id in self._data:
+                self._delete(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._data), "bytes": self._bytes}
+
+    def _set(self, session_id, blob):
+        if session_id in self._data:
+            self._delete(session_id)
+        self._data[session_id] = (blob, time.monotonic() + self.ttl)
+        self._bytes += len(session_id) + len(blob)
+        while self._bytes > self.max_bytes and len(self._data) > 1:
+            self._delete(next(iter(self._data)))
+
+    def _delete(self, session_id):
+        blob, _ = self._data.pop(session_id)
+        self._bytes -= len(session_id) + len(blob)
+
+
+class SQLiteBackend:
+    """Sessions in a local SQLite file, so every worker on the machine sees the same history.
+    Expired sessions and, past max_bytes, the least recently updated ones are removed every
+    `cleanup_every` writes."""
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES, cleanup_every=200):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id):
+        row = self._connect().execute("SELECT data FROM sessions WHERE id = ? AND updated > ?",
+                                      (session_id, time.time() - self.ttl)).fetchone()
+        return row[0] if row else None
+
+    def set(self, session_id, blob):
+        with self._connect() as db:
+            db.execute(UPSERT, (session_id, blob, time.time()))
+        self._wrote()
+
+    # Function to replace a session's blob with fn(current blob or None) in one transaction, so
+    # concurrent turns from other workers wait instead of overwriting each other
+    def update(self, session_id, fn):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT data FROM sessions WHERE id = ? AND updated > ?",
+                             (session_id, time.time() - self.ttl)).fetchone()
+            db.execute(UPSERT, (session_id, fn(row[0] if row else None), time.time()))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        self._wrote()
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.cleanup_every == 0:
+            self.cleanup()
+
+    def delete(self, session_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    # Function to drop expired sessions, then the oldest ones while the table is over max_bytes
+    def cleanup(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE updated <= ?", (time.time() - self.ttl,))
+            total = db.execute("SELECT COALESCE(SUM(LENGTH(id) + LENGTH(data)), 0) FROM sessions").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            excess = total - self.max_bytes
+            cutoff = None
+            for session_id, size, updated in db.execute(
+                    "SELECT id, LENGTH(id) + LENGTH(data), updated FROM sessions ORDER BY updated"):
+                excess -= size
+                cutoff = updated
+                if excess <= 0:
+                    break
+            db.execute("DELETE FROM sessions WHERE updated <= ?", (cutoff,))
+
+    def stats(self):
+        sessions, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(id) + LENGTH(data)), 0) FROM sessions").fetchone()
+        return {"sessions": sessions, "bytes": size}
+
+
+class SessionStore:
+    def __init__(self, backend, token_budget=SESSION_TOKEN_BUDGET, summary_tokens=SESSION_SUMMARY_TOKENS):
+        self.backend = backend
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+
+    def _load(self, session_id):
+        return self._parse(self.backend.get(session_id) if session_id else None)
+
+    @staticmethod
+    def _parse(blob):
+        return json.loads(blob) if blob else {"s": "", "t": []}
+
+    # Function to build the messages to send upstream: summary, kept turns, then the new message
+    def messages(self, session_id, user_message):
+        state = self._load(session_id)
+        messages = []
+        if state["s"]:
+            messages.append({"role": "assistant", "content": f"Earlier in this conversation: {state['s']}"})
+        messages += [{"role": ROLES[role], "content": text} for role, text in state["t"]]
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    # Function to record one exchange and trim the session back under its token budget
+    def append(self, session_id, user_message, reply):
+        def add_turn(blob):
+            state = self._parse(blob)
+            turns = state["t"] + [["u", user_message], ["a", reply]]
+            summary = state["s"]
+
+            used = sum(estimate_tokens(text) for _, text in turns) + estimate_tokens(summary)
+            while used > self.token_budget and len(turns) > 2:
+                _, text = turns.pop(0)
+                used -= estimate_tokens(text)
+                if self.summary_tokens:
+                    summary = self._fold(summary, text)
+                    used = sum(estimate_tokens(t) for _, t in turns) + estimate_tokens(summary)
+
+            return json.dumps({"s": summary, "t": turns}, separators=(",", ":"), ensure_ascii=False)
+
+        self.backend.update(session_id, add_turn)
+
+    # Function to end a session and forget its history
+    def clear(self, session_id):
+        self.backend.delete(session_id)
+
+    # Add the first sentence of a dropped turn to the summary, keeping only its most recent part
+    def _fold(self, summary, text):
+        match = FIRST_SENTENCE.match(text.strip())
+        sentence = match.group(1) if match else text.strip()
+        summary = f"{summary} {sentence}".strip()
+        max_chars = self.summary_tokens * 4
+        if len(summary) > max_chars:
+            summary = summary[-max_chars:]
+            cut = summary.find(". ")  # start at the next whole sentence
+            summary = summary[cut + 2:] if cut >= 0 else summary
+        return summary
+
+
+# Function to build the session store configured by SESSION_BACKEND
+def make_store():
+    if SESSION_BACKEND == "sqlite":
+        return SessionStore(SQLiteBackend())
+    return SessionStore(MemoryBackend())
@@ -0,0 +1,158 @@
+import os
+import asyncio
+import threading
+
+# ✅ Request coalescing ("single flight").
+# While a call for a key is in progress, other callers with the same key wait for it and get the
+# same result instead of starting their own upstream call. Nothing is cached: once the call
+# finishes (or fails) the key is free again, so an error only reaches the callers that were
+# already waiting for it, and the next caller tries again.
+# stream() does the same for a streamed reply: later callers replay the chunks the first caller
+# has received so far, then follow along as the rest arrive.
+
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "60"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+
+class Group:
+    def __init__(self, timeout=SINGLEFLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._calls = {}
+        self._async_calls = {}  # (event loop, key) -> shared task
+        self._streams = {}  # key -> _Stream being read by its first caller
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    # Function to run fn() once per key at a time; concurrent callers share its result or error.
+    # Waiters give up with TimeoutError after `timeout` seconds, the call itself keeps running.
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(self.timeout if timeout is None else timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"timed out waiting for in-flight call {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    # Async version: coro_fn() runs once per key per event loop as a task that all callers await.
+    # A caller that is cancelled or times out does not cancel the shared task.
+    async def ado(self, key, coro_fn, timeout=None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._async_calls.get((loop, key))
+            if task is None:
+                task = loop.create_task(coro_fn())
+                self._async_calls[(loop, key)] = task
+                task.add_done_callback(lambda t: self._async_done(loop, key, t))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"timed out waiting for in-flight call {key!r}") from None
+
+    # Function to share a stream: the first caller for a key iterates chunks_fn(), concurrent callers
+    # get the same chunks from the start. Followers give up with TimeoutError if no chunk arrives
+    # for `timeout` seconds; an error from the stream reaches everyone following it.
+    def stream(self, key, chunks_fn, timeout=None):
+        with self._lock:
+            shared = self._streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._streams[key] = _Stream()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            return self._lead(key, shared, chunks_fn)
+        return self._follow(key, shared, self.timeout if timeout is None else timeout)
+
+    def _lead(self, key, shared, chunks_fn):
+        try:
+            for chunk in chunks_fn():
+                with shared.changed:
+                    shared.chunks.append(chunk)
+                    shared.changed.notify_all()
+                yield chunk
+        except BaseException as e:
+            shared.error = e if isinstance(e, Exception) else RuntimeError(f"stream {key!r} was abandoned")
+            raise
+        finally:
+            with self._lock:
+                del self._streams[key]
+            with shared.changed:
+                shared.done = True
+                shared.changed.notify_all()
+
+    def _follow(self, key, shared, timeout):
+        position = 0
+        while True:
+            with shared.changed:
+                while position >= len(shared.chunks) and not shared.done:
+                    if not shared.changed.wait(timeout):
+                        with self._lock:
+                            self.timeouts += 1
+                        raise TimeoutError(f"timed out waiting for in-flight stream {key!r}")
+                pending = shared.chunks[position:]
+                finished = shared.done
+            yield from pending
+            position += len(pending)
+            if finished and position >= len(shared.chunks):
+                if shared.error is not None:
+                    raise shared.error
+                return
+
+    def _async_done(self, loop, key, task):
+        with self._lock:
+            self._async_calls.pop((loop, key), None)
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every waiter gave up
+
+    def stats(self):
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._calls) + len(self._async_calls) + len(self._streams),
+            }
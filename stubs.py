@@ -0,0 +1,171 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ✅ In-process stand-ins for Chatbase, OpenAI and ElevenLabs, for load tests and benchmarks.
+# Each stub listens on its own local port, answers with the same JSON/audio shapes as the real
+# API, and adds configurable latency and errors. Point upstream.py at them with the
+# CHATBASE_BASE_URL, OPENAI_BASE_URL and ELEVENLABS_BASE_URL variables (see env()).
+#
+#   python stubs.py   # run all three until Ctrl+C and print the variables to export
+
+REPLY_SENTENCES = [
+    "Practice a little every day.",
+    "Read short articles out loud to work on pronunciation.",
+    "Write down new words with an example sentence.",
+    "Try to think in English for a few minutes at a time.",
+    "Watch a show with English subtitles and repeat the lines.",
+]
+AUDIO_BYTES_PER_CHAR = 400  # roughly what a 128 kbps MP3 of speech takes
+STREAM_CHUNKS = 4
+
+
+class StubServer:
+    """One fake provider. latency is the mean delay in seconds before the first byte (streamed
+    replies spread another `latency` over their chunks), jitter the +/- spread around it, and
+    error_rate the share of requests answered with error_status."""
+
+    def __init__(self, provider, latency=0.2, jitter=0.1, error_rate=0.0, error_status=500, port=0):
+        self.provider = provider
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-{self.provider}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                stub.requests += 1
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.delay()
+
+                if random.random() < stub.error_rate:
+                    return self.send_body(stub.error_status, "application/json",
+                                          json.dumps({"error": f"{stub.provider} stub error"}).encode())
+
+                if stub.provider == "chatbase" and self.path == "/api/v1/chat":
+                    return self.chatbase(body)
+                if stub.provider == "openai" and self.path == "/v1/chat/completions":
+                    return self.openai(body)
+                match = re.fullmatch(r"/v1/text-to-speech/[^/]+(/stream)?", self.path)
+                if stub.provider == "elevenlabs" and match:
+                    return self.elevenlabs(body, bool(match.group(1)))
+                self.send_body(404, "application/json", b'{"error": "not found"}')
+
+            def chatbase(self, body):
+                text = make_reply(body.get("messages", []))
+                if body.get("stream"):
+                    words = text.split(" ")
+                    step = max(1, len(words) // STREAM_CHUNKS)
+                    chunks = [" ".join(words[i:i + step]) + " " for i in range(0, len(words), step)]
+                    return self.send_chunked(200, "text/plain; charset=utf-8", [c.encode() for c in chunks])
+                self.send_body(200, "application/json", json.dumps({"text": text}).encode())
+
+            def openai(self, body):
+                text = make_reply(body.get("messages", []))
+                data = {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+                self.send_body(200, "application/json", json.dumps(data).encode())
+
+            def elevenlabs(self, body, stream):
+                audio = fake_audio(body.get("text", ""))
+                if stream:
+                    step = max(1, len(audio) // STREAM_CHUNKS)
+                    return self.send_chunked(200, "audio/mpeg", [audio[i:i + step] for i in range(0, len(audio), step)])
+                self.send_body(200, "audio/mpeg", audio)
+
+            def send_body(self, status, content_type, data):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_chunked(self, status, content_type, chunks):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        stub.delay_between_chunks()
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def delay_between_chunks(self):
+        time.sleep(self.latency / STREAM_CHUNKS)
+
+
+# Function to make a deterministic reply for a conversation (same question, same answer)
+def make_reply(messages):
+    question = messages[-1]["content"] if messages else ""
+    rng = random.Random(question)
+    count = rng.randint(2, len(REPLY_SENTENCES))
+    return " ".join(rng.sample(REPLY_SENTENCES, count))
+
+
+# Function to make MP3-sized filler bytes for a text (starts with an ID3 tag so players don't choke)
+def fake_audio(text):
+    return b"ID3\x04\x00\x00\x00\x00\x00\x00" + bytes(len(text) * AUDIO_BYTES_PER_CHAR)
+
+
+# Function to start all three stubs; returns {provider: StubServer}
+def start_stubs(chatbase=None, openai=None, elevenlabs=None):
+    options = {"chatbase": chatbase or {}, "openai": openai or {}, "elevenlabs": elevenlabs or {}}
+    return {provider: StubServer(provider, **kwargs).start() for provider, kwargs in options.items()}
+
+
+# Function to get the environment variables that point upstream.py at the stubs
+def env(stubs):
+    return {f"{provider.upper()}_BASE_URL": stub.url for provider, stub in stubs.items()}
+
+
+if __name__ == "__main__":
+    running = start_stubs()
+    for name, value in env(running).items():
+        print(f"export {name}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for stub in running.values():
+            stub.stop()
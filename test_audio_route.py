@@ -0,0 +1,84 @@
+import stubs
+
+
+# Function to get the /audio path of a plain /chat reply (registered, not rendered yet)
+def audio_path(client, message):
+    response = client.post("/chat", json={"message": message})
+    assert response.status_code == 200
+    return "/audio/" + response.get_json()["audio_url"].rsplit("/audio/", 1)[1]
+
+
+def test_unknown_or_malformed_keys_are_404(client):
+    assert client.get("/audio/" + "0" * 64 + ".mp3").status_code == 404
+    assert client.get("/audio/../index.mp3").status_code == 404
+    assert client.get("/audio/not-a-key.mp3").get_json() == {"error": "Audio not found"}
+
+
+def test_first_fetch_streams_then_the_file_is_immutable(client):
+    path = audio_path(client, "What is a noun?")
+    key = path.rsplit("/", 1)[1][:-4]
+
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    audio = first.data
+    assert audio.startswith(b"ID3")
+
+    cached = client.get(path)
+    assert cached.status_code == 200
+    assert cached.data == audio
+    assert cached.headers["ETag"] == f'"{key}"'
+    cache_control = cached.headers["Cache-Control"]
+    assert "public" in cache_control and "immutable" in cache_control and "max-age=31536000" in cache_control
+    assert cached.headers["Accept-Ranges"] == "bytes"
+
+
+def test_if_none_match_is_304(client):
+    path = audio_path(client, "What is a verb?")
+    client.get(path).get_data()  # the first fetch renders it
+    etag = client.get(path).headers["ETag"]
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_range_is_206(client):
+    path = audio_path(client, "What is an adjective?")
+    audio = client.get(path).data
+    response = client.get(path, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.data == audio[:10]
+    assert response.headers["Content-Range"] == f"bytes 0-9/{len(audio)}"
+
+
+def test_elevenlabs_error_is_json(client, stub_servers):
+    path = audio_path(client, "What is a pronoun?")
+    stub_servers["elevenlabs"].error_rate = 1.0
+    response = client.get(path)
+    assert response.status_code == 500  # the stub's error status, passed through
+    assert response.get_json()["error"] == "ElevenLabs API error"
+
+
+def test_stalled_render_is_504(client, stub_servers, monkeypatch):
+    import chatbot_api
+
+    path = audio_path(client, "What is a preposition?")
+    monkeypatch.setattr(chatbot_api.tts_cache.flight, "timeout", 0.1)
+    monkeypatch.setattr(stub_servers["elevenlabs"], "latency", 0.5)
+    response = client.get(path)
+    assert response.status_code == 504
+    assert "timed out" in response.get_json()["details"]
+
+
+def test_failed_render_without_a_file_is_502(client, monkeypatch):
+    import chatbot_api
+
+    def failing_render(*job):
+        raise OSError("No space left on device")
+        yield
+
+    path = audio_path(client, "What is a conjunction?")
+    monkeypatch.setattr(chatbot_api, "render_speech", failing_render)
+    response = client.get(path)
+    assert response.status_code == 502
+    assert response.get_json() == {"error": "Audio render failed", "details": "No space left on device"}
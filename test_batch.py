@@ -0,0 +1,89 @@
+import time
+import threading
+
+import pytest
+
+from batch import BatchRunner, RateLimiter, TooManyJobs
+
+
+def process(message):
+    if message == "fail":
+        raise ValueError("upstream error")
+    time.sleep(0.01 * len(message) % 0.05)
+    return {"response": message.upper()}
+
+
+def test_results_arrive_for_every_item_and_failures_are_isolated():
+    runner = BatchRunner(process, workers=4)
+    job = runner.submit(["a", "fail", "bb", "ccc"])
+    results = list(job.iter_results())
+    assert sorted(r["index"] for r in results) == [0, 1, 2, 3]
+    assert [r["seq"] for r in results] == [0, 1, 2, 3]
+    assert {r["index"]: r["ok"] for r in results} == {0: True, 1: False, 2: True, 3: True}
+    assert job.summary()["failed"] == 1
+
+
+def test_items_run_concurrently():
+    runner = BatchRunner(lambda m: time.sleep(0.2) or {"response": m}, workers=10)
+    start = time.monotonic()
+    list(runner.submit([str(i) for i in range(10)]).iter_results())
+    assert time.monotonic() - start < 1
+
+
+def test_resume_from_a_position_returns_the_rest_only():
+    runner = BatchRunner(process, workers=4)
+    job = runner.submit([f"m{i}" for i in range(10)])
+    first = list(job.iter_results())
+    assert list(job.iter_results(6)) == first[6:]
+    assert runner.get(job.id) is job
+    assert runner.get("unknown") is None
+
+
+def test_negative_start_is_clamped():
+    runner = BatchRunner(process, workers=4)
+    job = runner.submit([f"m{i}" for i in range(5)])
+    assert len(list(job.iter_results(-2))) == 5
+
+
+def test_resume_waits_for_results_still_running():
+    release = threading.Event()
+    runner = BatchRunner(lambda m: release.wait(1) and {"response": m}, workers=2)
+    job = runner.submit(["a", "b"])
+    results = []
+    reader = threading.Thread(target=lambda: results.extend(job.iter_results()))
+    reader.start()
+    time.sleep(0.05)
+    assert results == []
+    release.set()
+    reader.join(1)
+    assert len(results) == 2
+
+
+def test_max_jobs_is_enforced_while_jobs_run():
+    release = threading.Event()
+    runner = BatchRunner(lambda m: release.wait(1) and {"response": m}, workers=2, max_jobs=2)
+    runner.submit(["a"])
+    runner.submit(["b"])
+    with pytest.raises(TooManyJobs):
+        runner.submit(["c"])
+    release.set()
+    time.sleep(0.1)
+    runner.submit(["d"])  # finished jobs make room
+    assert runner.stats()["jobs"] <= 2
+
+
+def test_finished_jobs_expire_after_ttl():
+    runner = BatchRunner(process, workers=2, ttl=0.05)
+    job = runner.submit(["a"])
+    list(job.iter_results())
+    time.sleep(0.1)
+    runner.submit(["b"])
+    assert runner.get(job.id) is None
+
+
+def test_rate_limiter_paces_calls():
+    limiter = RateLimiter(rate=20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.18
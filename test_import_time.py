@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+
+import pytest
+
+# ✅ Import-time budget: a new gunicorn worker should be able to import the app quickly and
+# without side effects. Each check imports the module in a fresh interpreter, in an empty
+# directory, and reports the time taken, the heavy modules loaded and anything created.
+#
+#   python -m pytest test_import_time.py
+#   python test_import_time.py          # just print the measurements
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "500"))
+RUNS = 3  # best of, to keep a busy machine from failing the test
+
+PROBE = """
+import sys, time, json, threading
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("numpy", "elevenlabs", "pydub", "openai") if m in sys.modules]
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy, "threads": threading.active_count()}}))
+"""
+
+
+# Function to import a module in a fresh interpreter, returns the fastest run plus the files it created
+def measure(module, **env_vars):
+    runs = []
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, PYTHONPATH=REPO_DIR, PYTHONDONTWRITEBYTECODE="1", **env_vars)
+        for _ in range(RUNS):
+            out = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=cwd, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        created = sorted(os.listdir(cwd))
+    best = min(runs, key=lambda run: run["ms"])
+    best["created"] = created
+    return best
+
+
+def test_chatbot_api_import_is_fast_and_side_effect_free():
+    result = measure("chatbot_api")
+    assert result["ms"] <= IMPORT_BUDGET_MS, f"import chatbot_api took {result['ms']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f})"
+    assert result["heavy"] == [], f"import chatbot_api loaded {result['heavy']}"
+    assert result["threads"] == 1, "import chatbot_api started threads"
+    assert result["created"] == [], f"import chatbot_api created {result['created']}"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_chatbot_import_builds_no_state_or_runs_the_demo(backend):
+    result = measure("chatbot", SESSION_BACKEND=backend, REPLY_CACHE_NEAR="1")
+    assert result["heavy"] == [], f"import chatbot loaded {result['heavy']}"
+    assert result["threads"] == 1, "import chatbot started threads"
+    assert result["created"] == [], f"import chatbot created {result['created']}"
+
+
+if __name__ == "__main__":
+    for module in ("chatbot_api", "chatbot"):
+        result = measure(module)
+        print(f"{module}: {result['ms']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f}), heavy modules: {result['heavy']}, "
+              f"threads: {result['threads']}, created: {result['created']}")
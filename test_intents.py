@@ -0,0 +1,89 @@
+import pytest
+
+from intents import IntentEngine, tokenize
+
+RULES = [
+    {"name": "greeting", "patterns": ["hi", "hello", "hi there"], "response": "greeting"},
+    {"name": "how_are_you", "patterns": ["how are you", "how are you doing"], "response": "how_are_you"},
+    {"name": "hi_there_twin", "patterns": ["hi there"], "response": "twin"},
+    {"name": "goodbye", "patterns": ["see you later"], "response": "goodbye"},
+    {"name": "alligator", "patterns": ["you later alligator"], "response": "alligator"},
+    {"name": "are_you", "patterns": ["are you"], "response": "are_you"},
+]
+
+# Questions about a phrase must reach the chatbot, even though they contain the phrase
+QUESTIONS_ABOUT_PHRASES = [
+    'What does "see you later" mean?',
+    'Is "how are you" correct?',
+    'What does "how are you doing" mean?',
+    "What does how are you doing mean?",
+    "Is 'hello' formal?",
+    "hi, how do I use the past perfect?",
+]
+
+
+@pytest.fixture
+def engine():
+    return IntentEngine(RULES)
+
+
+@pytest.fixture(scope="module")
+def shipped():
+    return IntentEngine.from_file()
+
+
+def test_tokenize_strips_quotes_but_keeps_inner_apostrophes():
+    assert tokenize("'Hello' it's HOW'S") == ["hello", "it's", "how's"]
+
+
+def test_whole_words_only(engine):
+    assert engine.match("this is which") is None
+    assert engine.match("Hi!")[0]["name"] == "greeting"
+
+
+def test_longest_match_wins(engine):
+    assert engine.match("how are you doing")[0]["name"] == "how_are_you"
+    assert engine.match("hi there")[0]["name"] == "greeting"  # 2 words beat "hi"
+
+
+def test_ties_go_to_the_earlier_rule(engine):
+    reordered = IntentEngine([RULES[2], RULES[0]])
+    assert engine.match("hi there")[0]["name"] == "greeting"
+    assert reordered.match("hi there")[0]["name"] == "hi_there_twin"
+
+
+def test_failure_links_find_overlapping_patterns(engine):
+    # After "see you later" the automaton has to fall back to "you later" to find "alligator"
+    rule, coverage = engine.match("see you later alligator")
+    assert rule["name"] == "goodbye"  # same length as "you later alligator", listed first
+    assert coverage == 1.0
+    # "are you" ends on a state of "how are you doing" and is found through its merged outputs
+    partial = IntentEngine([{"name": "long", "patterns": ["how are you doing"], "response": "long"},
+                            {"name": "are_you", "patterns": ["are you"], "response": "are_you"}])
+    rule, coverage = partial.match("how are you")
+    assert rule["name"] == "are_you"
+    assert coverage == pytest.approx(2 / 3)
+
+
+def test_coverage_threshold(engine):
+    rule, coverage = engine.match("hello please")
+    assert coverage == 0.5
+    assert engine.reply("hello please", min_coverage=0.5) == "greeting"
+    assert engine.reply("hello please", min_coverage=0.6) is None
+
+
+def test_small_talk_is_answered_locally(shipped):
+    assert shipped.reply("Hi, how are you?").startswith("I'm just a bot")
+    assert shipped.reply("see you later").startswith("Goodbye")
+    assert shipped.reply("'hello'").startswith("Hi there")
+    assert shipped.reply("Thank you very much, Chatty!").startswith("You're welcome")
+
+
+@pytest.mark.parametrize("message", QUESTIONS_ABOUT_PHRASES)
+def test_questions_about_a_phrase_go_upstream(shipped, message):
+    assert shipped.reply(message) is None
+
+
+def test_quoted_phrase_next_to_a_filler_goes_upstream(engine):
+    assert engine.reply('"hello" please') is None
+    assert engine.reply('"hello"') == "greeting"
@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "_stages", {})
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "METRICS_SAMPLE_RATE", 1.0)
+    metrics._request_spans.set(None)
+
+
+def test_quantiles_sum_count_and_errors_in_prometheus_format():
+    for ms in range(1, 101):
+        metrics.observe("chatbase", ms / 1000, ok=ms % 10 != 0)
+    metrics.inc("audio_bytes", 2048)
+    text = metrics.render({"reply_cache_entries": 3})
+
+    assert 'chatbot_stage_seconds{stage="chatbase",quantile="0.5"} 0.051000' in text
+    assert 'chatbot_stage_seconds{stage="chatbase",quantile="0.95"} 0.096000' in text
+    assert 'chatbot_stage_seconds{stage="chatbase",quantile="0.99"} 0.100000' in text
+    assert 'chatbot_stage_seconds_sum{stage="chatbase"} 5.050000' in text
+    assert 'chatbot_stage_seconds_count{stage="chatbase"} 100' in text
+    assert 'chatbot_stage_errors_total{stage="chatbase"} 10' in text
+    assert "# TYPE chatbot_audio_bytes_total counter\nchatbot_audio_bytes_total 2048" in text
+    assert "# TYPE chatbot_reply_cache_entries gauge\nchatbot_reply_cache_entries 3" in text
+    assert text.endswith("\n")
+
+
+def test_span_times_a_block_and_counts_exceptions_as_errors():
+    with metrics.span("tts"):
+        time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with metrics.span("tts"):
+            raise ValueError
+    stage = metrics._stages["tts"]
+    assert stage.count == 2 and stage.errors == 1
+    assert stage.total >= 0.01
+
+
+def test_rate_zero_records_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_SAMPLE_RATE", 0.0)
+    metrics.start_request()
+    with metrics.span("chatbase"):
+        pass
+    metrics.observe("openai", 0.1)
+    metrics.inc("audio_bytes")
+    assert metrics._stages == {} and metrics._counters == {}
+    assert metrics.server_timing() is None
+
+
+def test_fractional_rate_samples_whole_requests(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_SAMPLE_RATE", 0.25)
+    sampled = 0
+    for _ in range(2000):
+        metrics.start_request()
+        metrics.observe("chatbase", 0.1)
+        metrics.observe("tts", 0.1)  # same decision as the first span of the request
+        sampled += metrics.server_timing() is not None
+    assert 350 < sampled < 650
+    assert metrics._stages["chatbase"].count == metrics._stages["tts"].count == sampled
+
+
+def test_server_timing_lists_the_spans_of_the_request():
+    metrics.start_request()
+    metrics.observe("local_lookup", 0.0012)
+    metrics.observe("reply", 0.25)
+    assert metrics.server_timing() == "local_lookup;dur=1.2, reply;dur=250.0"
+
+
+class FakeLog:
+    def __init__(self):
+        self.records = []
+
+    def log(self, record):
+        self.records.append(record)
+
+
+def test_server_timing_header_on_a_plain_reply(client):
+    response = client.post("/chat", json={"message": "What is a noun?"})
+    timing = response.headers["Server-Timing"]
+    assert "reply;dur=" in timing and "total;dur=" in timing
+
+
+def test_streamed_chat_is_recorded_when_the_body_is_sent(client, stub_servers, monkeypatch):
+    import chatbot_api
+
+    log = FakeLog()
+    monkeypatch.setattr(chatbot_api, "request_log", log)
+    monkeypatch.setattr(stub_servers["chatbase"], "latency", 0.3)
+    response = client.post("/chat", json={"message": "What is an adverb?", "stream": True})
+    assert "headers;dur=" in response.headers["Server-Timing"]
+    assert json.loads(response.get_data(as_text=True).splitlines()[-1])["type"] == "done"
+    response.close()
+
+    assert len(log.records) == 1
+    assert log.records[0]["stream"] is True
+    assert log.records[0]["latency_ms"] >= 300  # the whole stream, not just building the Response
@@ -0,0 +1,29 @@
+import threading
+
+from priority_pool import PriorityPool
+
+
+def test_lowest_priority_runs_first_and_ties_keep_their_order():
+    pool = PriorityPool(1)
+    release, order = threading.Event(), []
+    pool.submit(0, release.wait)  # keeps the only worker busy while the rest is queued
+    futures = [pool.submit(priority, order.append, name)
+               for priority, name in [(3, "reply 1, sentence 4"), (1, "reply 1, sentence 2"),
+                                      (0, "reply 2, sentence 1"), (1, "reply 2, sentence 2")]]
+    release.set()
+    for future in futures:
+        future.result(timeout=1)
+    assert order == ["reply 2, sentence 1", "reply 1, sentence 2", "reply 2, sentence 2", "reply 1, sentence 4"]
+
+
+def test_errors_reach_the_future():
+    future = PriorityPool(2).submit(0, lambda: 1 / 0)
+    assert isinstance(future.exception(timeout=1), ZeroDivisionError)
+
+
+def test_threads_are_started_as_work_arrives_up_to_workers():
+    pool = PriorityPool(2)
+    assert pool._threads == []
+    for future in [pool.submit(0, lambda: None) for _ in range(5)]:
+        future.result(timeout=1)
+    assert len(pool._threads) == 2
@@ -0,0 +1,154 @@
+import time
+
+import pytest
+
+import provider_router
+from provider_router import ProviderRouter, ProviderHealth, AllProvidersFailed
+
+
+def provider(reply, delay=0.0, fail=False, calls=None):
+    def fn(message):
+        if calls is not None:
+            calls.append(message)
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("boom")
+        return reply
+    return fn
+
+
+def stream(chunks, first_delay=0.0, fail_before=False, fail_after=False, calls=None):
+    def fn(message):
+        if calls is not None:
+            calls.append(message)
+        time.sleep(first_delay)
+        if fail_before:
+            raise RuntimeError("stream failed")
+        for chunk in chunks:
+            yield chunk
+        if fail_after:
+            raise RuntimeError("stream cut")
+    return fn
+
+
+def test_primary_answers_without_hedging():
+    secondary_calls = []
+    router = ProviderRouter([("a", provider("A")), ("b", provider("B", calls=secondary_calls))], hedge_after=0.5)
+    assert router.call("hi") == ("a", "A")
+    assert secondary_calls == []
+
+
+def test_slow_primary_is_hedged_and_the_faster_reply_wins():
+    router = ProviderRouter([("a", provider("A", delay=1.0)), ("b", provider("B", delay=0.05))], hedge_after=0.1)
+    start = time.monotonic()
+    assert router.call("hi") == ("b", "B")
+    assert time.monotonic() - start < 0.5
+
+
+def test_failure_moves_on_without_waiting_for_the_hedge():
+    router = ProviderRouter([("a", provider("A", fail=True)), ("b", provider("B"))], hedge_after=5)
+    start = time.monotonic()
+    assert router.call("hi") == ("b", "B")
+    assert time.monotonic() - start < 1
+
+
+def test_all_failing_raises_with_every_error():
+    router = ProviderRouter([("a", provider("A", fail=True)), ("b", provider("", fail=False))], hedge_after=0.1)
+    with pytest.raises(AllProvidersFailed) as info:
+        router.call("hi")
+    assert set(info.value.errors) == {"a", "b"}
+
+
+def test_excluded_provider_is_not_called():
+    calls = []
+    router = ProviderRouter([("a", provider("A", calls=calls)), ("b", provider("B"))])
+    assert router.call("hi", exclude={"a"}) == ("b", "B")
+    assert calls == []
+
+
+def test_breaker_opens_then_lets_one_trial_call_through(monkeypatch):
+    monkeypatch.setattr(provider_router, "BREAKER_MIN_CALLS", 3)
+    monkeypatch.setattr(provider_router, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(provider_router, "BREAKER_COOLDOWN", 0.1)
+    health = ProviderHealth(window=10)
+    for _ in range(3):
+        assert health.allow()
+        health.record(0.01, False)
+    assert not health.allow()
+    assert health.snapshot()["state"] == "open"
+
+    time.sleep(0.15)
+    assert health.snapshot()["state"] == "half_open"
+    assert health.allow()          # the trial call
+    assert not health.allow()      # only one at a time
+    health.record(0.01, True)
+    assert health.snapshot()["state"] == "closed"
+    assert health.allow()
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    monkeypatch.setattr(provider_router, "BREAKER_MIN_CALLS", 1)
+    monkeypatch.setattr(provider_router, "BREAKER_COOLDOWN", 0.05)
+    health = ProviderHealth()
+    health.record(0.01, False)
+    time.sleep(0.06)
+    assert health.allow()
+    health.record(0.01, False)
+    assert health.snapshot()["state"] == "open"
+
+
+def test_open_breaker_skips_the_provider():
+    calls = []
+    router = ProviderRouter([("a", provider("A", calls=calls)), ("b", provider("B"))])
+    router.health["a"].open_until = time.monotonic() + 60
+    assert router.call("hi") == ("b", "B")
+    assert calls == []
+
+
+def test_stream_is_used_when_its_first_chunk_is_on_time():
+    fallback_calls = []
+    router = ProviderRouter([("a", provider("A")), ("b", provider("B", calls=fallback_calls))], hedge_after=0.5)
+    assert list(router.stream("a", stream(["Hel", "lo"]), "hi")) == ["Hel", "lo"]
+    assert fallback_calls == []
+
+
+def test_slow_stream_is_hedged_on_time_to_first_chunk():
+    primary_calls = []
+    router = ProviderRouter([("a", provider("A", calls=primary_calls)), ("b", provider("B", delay=0.05))],
+                            hedge_after=0.1)
+    start = time.monotonic()
+    assert list(router.stream("a", stream(["slow"], first_delay=1.0), "hi")) == ["B"]
+    assert time.monotonic() - start < 0.5
+    assert primary_calls == []  # the fallback never asks the streaming provider again
+
+
+def test_failed_stream_falls_back_without_asking_the_same_provider_again():
+    primary_calls, stream_calls = [], []
+    router = ProviderRouter([("a", provider("A", calls=primary_calls)), ("b", provider("B"))], hedge_after=5)
+    start = time.monotonic()
+    assert list(router.stream("a", stream([], fail_before=True, calls=stream_calls), "hi")) == ["B"]
+    assert time.monotonic() - start < 1
+    assert len(stream_calls) == 1 and primary_calls == []
+
+
+def test_stream_failing_after_sending_text_raises():
+    router = ProviderRouter([("a", provider("A")), ("b", provider("B"))], hedge_after=5)
+    chunks = router.stream("a", stream(["part"], fail_after=True), "hi")
+    assert next(chunks) == "part"
+    with pytest.raises(RuntimeError):
+        list(chunks)
+
+
+def test_stream_with_open_breaker_goes_straight_to_the_others():
+    stream_calls = []
+    router = ProviderRouter([("a", provider("A")), ("b", provider("B"))])
+    router.health["a"].open_until = time.monotonic() + 60
+    assert list(router.stream("a", stream(["x"], calls=stream_calls), "hi")) == ["B"]
+    assert stream_calls == []
+
+
+def test_stream_and_fallback_both_failing_raises():
+    router = ProviderRouter([("a", provider("A")), ("b", provider("B", fail=True))], hedge_after=5)
+    with pytest.raises(AllProvidersFailed) as info:
+        list(router.stream("a", stream([], fail_before=True), "hi"))
+    assert set(info.value.errors) == {"a", "b"}
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Function to run replay.py in-process against the stubs from a scratch directory, returns its output
+def run_replay(cwd, *extra):
+    log = cwd / "logs" / "requests.jsonl"
+    log.parent.mkdir()
+    log.write_text("".join(json.dumps({"message": m, "stream": s}) + "\n"
+                           for m, s in [("What is a noun?", False), ("Explain the past perfect.", True)]))
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, WARMUP_PROVIDERS="")
+    env.pop("REQUEST_LOG_PATH", None)
+    out = subprocess.run([sys.executable, os.path.join(REPO_DIR, "replay.py"), str(log), "--count", "6", "--qps", "0",
+                          "--chatbase-latency", "0.01", "--openai-latency", "0.01", "--elevenlabs-latency", "0.01",
+                          *extra], cwd=cwd, env=env, capture_output=True, text=True, timeout=120, check=True).stdout
+    return log, out
+
+
+def test_replay_does_not_append_to_the_log_it_reads(tmp_path):
+    log, out = run_replay(tmp_path)
+    assert len(log.read_text().splitlines()) == 2
+    assert '"200": 6' in out
+
+
+def test_replay_fetches_audio_for_plain_and_streamed_replies(tmp_path):
+    _, out = run_replay(tmp_path)
+    assert "first audio: p50" in out
+
+
+def test_no_audio_is_reported(tmp_path):
+    _, out = run_replay(tmp_path, "--no-audio")
+    assert "not fetched (--no-audio)" in out
+
+
+def test_latency_counts_from_the_scheduled_send_time(tmp_path):
+    # One worker, 100 req/s wanted: the app falls behind and later requests wait for the worker
+    _, out = run_replay(tmp_path, "--count", "10", "--qps", "100", "--concurrency", "1")
+    lines = dict(line.split(":", 1) for line in out.splitlines() if ":" in line)
+    lag_max = float(lines["send lag"].split("max")[1].split("ms")[0])
+    latency_max = float(lines["latency"].split("max")[1].split("ms")[0])
+    assert lag_max > 0
+    assert latency_max >= lag_max
+    assert "req/s achieved" in lines["throughput"]
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from reply_cache import ReplyCache, normalize
+
+# Pairs that differ by one meaningful word and must never share a reply
+ONE_WORD_APART = [
+    ("What is the past tense of swim?", "What is the past tense of swing?"),
+    ("What is the opposite of happy?", "What is the opposite of unhappy?"),
+    ("How do I use the word 'big'?", "How do I use the word 'bag'?"),
+    ("Please answer question number 1 about grammar", "Please answer question number 2 about grammar"),
+    ("What is the difference between was and were?", "What is the difference between is and are?"),
+    ("When do I use a or an?", "When do I use the or a?"),
+    ("Does dog bites man mean the same as man bites dog?", "Does man bites dog mean the same as dog bites man?"),
+]
+
+
+def test_normalize_ignores_case_punctuation_and_spacing():
+    assert normalize("  What's the   PAST tense?! ") == "what's the past tense"
+
+
+def test_exact_hit_after_normalizing():
+    cache = ReplyCache()
+    cache.put("How are you?", "Fine!")
+    assert cache.get("how are you") == "Fine!"
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("near", [False, True])
+@pytest.mark.parametrize("cached, asked", ONE_WORD_APART)
+def test_one_word_apart_is_a_miss(cached, asked, near):
+    cache = ReplyCache(near=near, max_entries=100)
+    cache.put(cached, "reply for the cached question")
+    assert cache.get(asked) is None
+
+
+def test_numbered_questions_each_get_their_own_reply():
+    cache = ReplyCache(near=True, max_entries=100)
+    for i in range(40):
+        assert cache.get(f"Explain lesson item number {i}") is None
+        cache.put(f"Explain lesson item number {i}", f"reply {i}")
+    assert cache.stats()["near_hits"] == 0
+
+
+def test_near_duplicate_with_same_words_hits_when_enabled():
+    cache = ReplyCache(near=True, max_entries=100)
+    cache.put("What is the past tense of swim?", "swam")
+    assert cache.get("Hi! What is the past tense of swim, please?") == "swam"
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_near_duplicate_of_an_expired_entry_is_a_miss():
+    cache = ReplyCache(ttl=0.05, near=True, max_entries=100)
+    cache.put("What is a noun?", "a naming word")
+    time.sleep(0.1)
+    assert cache.get("hello what is a noun") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_near_duplicate_tier_is_off_by_default():
+    cache = ReplyCache(max_entries=100)
+    cache.put("What is the past tense of swim?", "swam")
+    assert cache.get("what is the past tense of swim please") is None
+
+
+def test_entries_expire_after_ttl():
+    cache = ReplyCache(ttl=0.05, near=True, max_entries=10)
+    cache.put("hello there", "hi")
+    time.sleep(0.1)
+    assert cache.get("hello there") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_dropped_first():
+    cache = ReplyCache(max_entries=2, near=True)
+    cache.put("first question", "1")
+    cache.put("second question", "2")
+    cache.get("first question")
+    cache.put("third question", "3")
+    assert cache.get("second question") is None
+    assert cache.get("first question") == "1"
+    assert cache.get("third question") == "3"
+
+
+@pytest.mark.parametrize("max_entries", [0, -1])
+def test_max_entries_zero_turns_the_cache_off(max_entries):
+    cache = ReplyCache(max_entries=max_entries, near=True)
+    cache.put("hello there", "hi")
+    assert cache.get("hello there") is None
@@ -0,0 +1,133 @@
+import time
+import threading
+
+import pytest
+
+from sessions import MemoryBackend, SQLiteBackend, SessionStore, estimate_tokens
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "sessions.sqlite3"))
+
+
+def test_messages_include_history_then_the_new_message(backend):
+    store = SessionStore(backend)
+    store.append("s1", "What is a noun?", "A naming word.")
+    assert store.messages("s1", "And a verb?") == [
+        {"role": "user", "content": "What is a noun?"},
+        {"role": "assistant", "content": "A naming word."},
+        {"role": "user", "content": "And a verb?"},
+    ]
+    assert store.messages("other", "hi") == [{"role": "user", "content": "hi"}]
+
+
+def test_history_is_trimmed_to_the_token_budget_with_a_summary(backend):
+    store = SessionStore(backend, token_budget=60, summary_tokens=20)
+    for i in range(10):
+        store.append("s1", f"Question {i} about tenses. More detail here.", f"Answer {i}. With an explanation.")
+
+    messages = store.messages("s1", "next")
+    history = messages[1:-1]
+    assert sum(estimate_tokens(m["content"]) for m in messages[:-1]) <= 60 + 10
+    assert history[-1]["content"] == "Answer 9. With an explanation."
+    assert messages[0]["content"].startswith("Earlier in this conversation: ")
+    assert "More detail" not in messages[0]["content"]  # only first sentences are kept
+
+
+def test_no_summary_when_disabled(backend):
+    store = SessionStore(backend, token_budget=30, summary_tokens=0)
+    for i in range(5):
+        store.append("s1", f"Question number {i}.", f"Answer number {i}.")
+    assert not store.messages("s1", "next")[0]["content"].startswith("Earlier")
+
+
+def test_clear_forgets_the_session(backend):
+    store = SessionStore(backend)
+    store.append("s1", "hi", "hello")
+    store.clear("s1")
+    assert len(store.messages("s1", "next")) == 1
+
+
+def test_sessions_expire_after_ttl(tmp_path):
+    for backend in (MemoryBackend(ttl=0.05), SQLiteBackend(str(tmp_path / "s.sqlite3"), ttl=0.05)):
+        store = SessionStore(backend)
+        store.append("s1", "hi", "hello")
+        time.sleep(0.1)
+        assert len(store.messages("s1", "next")) == 1
+
+
+def test_memory_backend_drops_least_recently_used_past_max_bytes():
+    backend = MemoryBackend(max_bytes=100)
+    backend.set("a", "x" * 40)
+    backend.set("b", "x" * 40)
+    backend.get("a")
+    backend.set("c", "x" * 40)
+    assert backend.get("b") is None
+    assert backend.get("a") and backend.get("c")
+    assert backend.stats()["bytes"] <= 100
+
+
+def test_sqlite_cleanup_removes_oldest_past_max_bytes(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "s.sqlite3"), max_bytes=100)
+    for name in "abc":
+        backend.set(name, "x" * 40)
+        time.sleep(0.01)
+    backend.cleanup()
+    assert backend.get("a") is None
+    assert backend.get("c")
+
+
+# Make every turn slow between reading the session and writing it back, so races show up
+@pytest.fixture
+def slow_turns(monkeypatch):
+    parse = SessionStore._parse
+
+    def slow_parse(blob):
+        time.sleep(0.002)
+        return parse(blob)
+    monkeypatch.setattr(SessionStore, "_parse", staticmethod(slow_parse))
+
+
+def test_concurrent_turns_from_two_workers_are_all_kept(tmp_path, slow_turns):
+    # Two backends on one file stand in for two gunicorn workers, each with several threads
+    path = str(tmp_path / "sessions.sqlite3")
+    stores = [SessionStore(SQLiteBackend(path), token_budget=100000), SessionStore(SQLiteBackend(path), token_budget=100000)]
+
+    def turns(worker, thread):
+        for i in range(10):
+            stores[worker].append("shared", f"w{worker} t{thread} q{i}", "ok")
+
+    threads = [threading.Thread(target=turns, args=(w, t)) for w in range(2) for t in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    questions = [m["content"] for m in stores[0].messages("shared", "next") if m["role"] == "user"][:-1]
+    assert len(questions) == 60
+    assert len(set(questions)) == 60
+
+
+def test_concurrent_turns_in_memory_are_all_kept(slow_turns):
+    store = SessionStore(MemoryBackend(), token_budget=100000)
+    threads = [threading.Thread(target=lambda t=t: [store.append("s", f"t{t} q{i}", "ok") for i in range(20)])
+               for t in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.messages("s", "next")) == 5 * 20 * 2 + 1
+
+
+def test_delete_endpoint_ends_a_session(client):
+    import chatbot_api
+
+    session_id = client.post("/chat", json={"message": "What is a noun?", "new_session": True}).get_json()["session_id"]
+    assert len(chatbot_api.sessions.messages(session_id, "next")) == 3
+
+    assert client.delete(f"/chat/session/{session_id}").status_code == 204
+    assert len(chatbot_api.sessions.messages(session_id, "next")) == 1
+    assert client.delete(f"/chat/session/{session_id}").status_code == 204  # already gone is fine
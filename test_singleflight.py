@@ -0,0 +1,179 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import Group
+
+
+# Function to start n threads calling fn at once, returns their results (or exceptions) in order
+def run_concurrently(n, fn):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_callers_share_one_call():
+    group, calls = Group(), []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "reply"
+
+    assert run_concurrently(10, lambda: group.do("q", slow)) == ["reply"] * 10
+    assert len(calls) == 1
+    assert group.stats() == {"leaders": 1, "coalesced": 9, "timeouts": 0, "in_flight": 0}
+
+
+def test_error_is_shared_with_waiters_only():
+    group, calls = Group(), []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("upstream down")
+
+    results = run_concurrently(5, lambda: group.do("q", failing))
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(calls) == 1
+    assert group.do("q", lambda: "recovered") == "recovered"  # not cached
+
+
+def test_waiter_times_out_but_the_call_keeps_running():
+    group = Group()
+    done = threading.Event()
+
+    def slow():
+        time.sleep(0.3)
+        done.set()
+        return "late"
+
+    leader = threading.Thread(target=group.do, args=("q", slow))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        group.do("q", slow, timeout=0.05)
+    leader.join()
+    assert done.is_set()
+    assert group.stats()["timeouts"] == 1
+
+
+def test_async_callers_share_one_task():
+    group, calls = Group(), []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "reply"
+
+    async def main():
+        return await asyncio.gather(*(group.ado("q", slow) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["reply"] * 10
+    assert len(calls) == 1
+    assert group.stats()["in_flight"] == 0
+
+
+def test_async_timeout_does_not_cancel_the_shared_task():
+    group = Group()
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "late"
+
+    async def main():
+        leader = asyncio.create_task(group.ado("q", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            await group.ado("q", slow, timeout=0.05)
+        return await leader
+
+    assert asyncio.run(main()) == "late"
+
+
+def test_async_error_is_shared():
+    group = Group()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(group.ado("q", failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+
+
+def test_stream_followers_replay_earlier_chunks_then_follow():
+    group, calls = Group(), []
+
+    def chunks():
+        calls.append(1)
+        for part in ["The ", "past ", "perfect."]:
+            time.sleep(0.05)
+            yield part
+
+    leader = group.stream("q", chunks)
+    first = next(leader)  # a chunk has arrived before anyone else asks
+    followers = [group.stream("q", chunks) for _ in range(3)]
+
+    collected = []
+    threads = [threading.Thread(target=lambda f=f: collected.append("".join(f))) for f in followers]
+    for thread in threads:
+        thread.start()
+    assert first + "".join(leader) == "The past perfect."
+    for thread in threads:
+        thread.join()
+    assert collected == ["The past perfect."] * 3
+    assert len(calls) == 1
+    assert group.stats()["in_flight"] == 0
+
+
+def test_stream_error_reaches_followers():
+    group = Group()
+
+    def chunks():
+        yield "partial "
+        time.sleep(0.1)
+        raise ValueError("stream cut")
+
+    leader = group.stream("q", chunks)
+    assert next(leader) == "partial "
+    follower = group.stream("q", chunks)
+    with pytest.raises(ValueError):
+        list(leader)
+    with pytest.raises(ValueError):
+        list(follower)
+
+
+def test_stream_follower_times_out_between_chunks():
+    group = Group()
+
+    def chunks():
+        yield "first "
+        time.sleep(0.3)
+        yield "second"
+
+    leader = group.stream("q", chunks)
+    next(leader)
+    follower = group.stream("q", chunks, timeout=0.05)
+    assert next(follower) == "first "
+    with pytest.raises(TimeoutError):
+        next(follower)
+    assert list(leader) == ["second"]
+    assert group.stats()["timeouts"] == 1
@@ -0,0 +1,56 @@
+import json
+
+from chatbot_api import split_sentences
+
+
+# Function to post a streamed /chat and return its NDJSON events
+def stream(client, message):
+    response = client.post("/chat", json={"message": message, "stream": True})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_split_sentences_keeps_the_unfinished_tail():
+    assert split_sentences("One. Two! Three? Fo") == (["One.", "Two!", "Three?"], "Fo")
+    assert split_sentences("No end yet") == ([], "No end yet")
+    assert split_sentences("Mr.Smith said hi. ") == (["Mr.Smith said hi."], "")
+
+
+def test_text_then_audio_per_sentence_then_done(client):
+    events = stream(client, "How do I improve my English?")
+    types = [event["type"] for event in events]
+    assert types[0] == "text"
+    assert types[-1] == "done" and types.count("done") == 1
+
+    done = events[-1]
+    audio = [event for event in events if event["type"] == "audio"]
+    assert done["segments"] == len(audio) >= 2
+    assert sorted(event["index"] for event in audio) == list(range(done["segments"]))
+    assert done["response"] == "".join(event["delta"] for event in events if event["type"] == "text")
+
+    # A sentence is only spoken after its text has been sent
+    for position, event in enumerate(events):
+        if event["type"] == "audio":
+            sent = "".join(e["delta"] for e in events[:position] if e["type"] == "text")
+            assert event["text"] in sent
+            assert event["audio_url"].endswith(".mp3")
+
+
+def test_failed_speech_is_an_audio_error_event(client, stub_servers):
+    stub_servers["elevenlabs"].error_rate = 1.0
+    events = stream(client, "What is the past perfect?")
+    done = events[-1]
+    errors = [event for event in events if event["type"] == "audio_error"]
+    assert done["type"] == "done"
+    assert len(errors) == done["segments"]
+    assert all("elevenlabs" in event["details"] for event in errors)
+
+
+def test_error_event_when_every_provider_fails(client, stub_servers):
+    stub_servers["chatbase"].error_rate = 1.0
+    stub_servers["openai"].error_rate = 1.0
+    events = stream(client, "Explain phrasal verbs.")
+    assert events[-1]["type"] == "error"
+    assert events[-1]["error"] == "Chatbot API error"
+    assert not any(event["type"] in ("audio", "done") for event in events)
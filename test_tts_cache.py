@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+
+import pytest
+
+from tts_cache import TTSCache
+
+VOICE = ("voice", "model", {"stability": 0.5})
+
+
+def render(text, voice_id, model_id, voice_settings):
+    yield text.encode() * 100
+
+
+def test_get_or_create_renders_once_then_hits(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    calls = []
+
+    def counting_render(*job):
+        calls.append(job)
+        yield from render(*job)
+
+    key, path = cache.get_or_create("hello", *VOICE, counting_render)
+    assert cache.get_or_create("hello", *VOICE, counting_render) == (key, path)
+    assert len(calls) == 1
+    assert open(path, "rb").read() == b"hello" * 100
+
+
+def test_budget_is_shared_by_every_worker_on_the_directory(tmp_path):
+    # Two caches on one directory stand in for two gunicorn workers
+    workers = [TTSCache(str(tmp_path), max_bytes=2000), TTSCache(str(tmp_path), max_bytes=2000)]
+    for i in range(10):
+        workers[i % 2].get_or_create(f"text {i:02d}", *VOICE, render)  # 700 bytes each
+        time.sleep(0.01)
+
+    files = [name for name in os.listdir(tmp_path) if name.endswith(".mp3")]
+    assert sum(os.path.getsize(tmp_path / name) for name in files) <= 2000
+    assert len(files) == 2
+
+
+def test_hit_keeps_a_file_from_eviction_in_other_workers(tmp_path):
+    # rescan_interval=0: every write rescans, as if the rescan timer had just run out
+    first, second = TTSCache(str(tmp_path), 2000, rescan_interval=0), TTSCache(str(tmp_path), 2000, rescan_interval=0)
+    old, _ = first.get_or_create("text old", *VOICE, render)
+    time.sleep(0.01)
+    newer, _ = first.get_or_create("text new", *VOICE, render)
+    time.sleep(0.01)
+    assert second.get(old)  # now the most recently used
+    time.sleep(0.01)
+    second.get_or_create("text 3rd", *VOICE, render)
+
+    assert first.get(old) is not None
+    assert first.get(newer) is None
+
+
+def test_get_after_eviction_by_another_worker_is_a_miss(tmp_path):
+    first, second = TTSCache(str(tmp_path), 800, rescan_interval=0), TTSCache(str(tmp_path), 800, rescan_interval=0)
+    key, _ = first.get_or_create("text one", *VOICE, render)
+    time.sleep(0.01)
+    second.get_or_create("text two", *VOICE, render)
+
+    assert first.get(key) is None
+    assert first.stats()["misses"] >= 1
+
+
+def test_directory_is_rescanned_on_the_timer_or_over_budget_only(tmp_path, monkeypatch):
+    cache = TTSCache(str(tmp_path), max_bytes=2000, rescan_interval=60)
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+
+    cache.get_or_create("text one", *VOICE, render)  # 700 bytes, under budget
+    cache.get_or_create("text two", *VOICE, render)
+    assert scans == []
+    cache.get_or_create("text 3rd", *VOICE, render)  # 2100 bytes tracked, over budget
+    assert len(scans) == 1
+    assert cache.stats()["bytes"] <= 2000
+
+
+def test_hits_do_not_wait_for_a_rescan(tmp_path, monkeypatch):
+    cache = TTSCache(str(tmp_path), rescan_interval=60)
+    key, _ = cache.get_or_create("hello", *VOICE, render)
+    real_scandir = os.scandir
+    scanning = threading.Event()
+
+    def slow_scandir(path):
+        scanning.set()
+        time.sleep(0.5)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", slow_scandir)
+    rescan = threading.Thread(target=cache._rescan)
+    rescan.start()
+    scanning.wait(1)
+    start = time.monotonic()
+    assert cache.get(key) is not None
+    assert time.monotonic() - start < 0.1
+    rescan.join()
+
+
+def test_registered_url_is_rendered_on_first_fetch(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = cache.register("hello", *VOICE)
+    assert cache.get(key) is None
+    assert b"".join(cache.stream(key, render)) == b"hello" * 100
+    assert cache.get(key) is not None
+
+
+def test_unknown_key_cannot_be_streamed(tmp_path):
+    assert TTSCache(str(tmp_path)).stream("0" * 64, render) is None
+
+
+def test_evicted_audio_is_rendered_again(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=800)
+    registered = cache.register("text one", *VOICE)
+    b"".join(cache.stream(registered, render))
+    eager, _ = cache.get_or_create("text two", *VOICE, render)  # per-sentence audio, rendered now
+    time.sleep(0.01)
+    cache.get_or_create("text 3rd", *VOICE, render)
+    assert cache.get(registered) is None and cache.get(eager) is None
+
+    for key, text in [(registered, b"text one"), (eager, b"text two")]:
+        assert b"".join(cache.stream(key, render)) == text * 100
+
+
+def test_old_jobs_are_pruned_while_running(tmp_path, monkeypatch):
+    import tts_cache
+    cache = TTSCache(str(tmp_path))
+    old = cache.register("an old reply", *VOICE)
+    long_ago = time.time() - tts_cache.TTS_JOB_MAX_AGE - 60
+    os.utime(cache._job_path(old), (long_ago, long_ago))
+
+    monkeypatch.setattr(tts_cache, "TTS_JOB_PRUNE_INTERVAL", 0)
+    cache._next_prune = 0.0
+    new = cache.register("a new reply", *VOICE)
+    assert cache.job(old) is None
+    assert cache.job(new) is not None
+
+
+def test_slow_listener_does_not_hold_the_render(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = cache.register("slow listener", *VOICE)
+    rendered = threading.Event()
+
+    def chunked_render(*job):
+        for i in range(5):
+            yield f"chunk {i};".encode()
+        rendered.set()  # the upstream response has been read completely
+
+    listener = cache.stream(key, chunked_render, chunk_size=4)
+    assert next(listener) == b"chun"
+    assert rendered.wait(1)  # finished while the listener has read only 4 bytes
+    assert b"chun" + b"".join(listener) == b"".join(f"chunk {i};".encode() for i in range(5))
+
+
+def test_concurrent_streams_share_one_render(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = cache.register("shared", *VOICE)
+    calls = []
+
+    def slow_render(*job):
+        calls.append(job)
+        for part in (b"one ", b"two ", b"three"):
+            time.sleep(0.05)
+            yield part
+
+    streams = [cache.stream(key, slow_render) for _ in range(5)]
+    assert [b"".join(s) for s in streams] == [b"one two three"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["streaming"] == 0
+
+
+def test_render_error_reaches_the_listener(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = cache.register("broken", *VOICE)
+
+    def failing_render(*job):
+        raise ValueError("elevenlabs down")
+        yield
+
+    with pytest.raises(ValueError):
+        b"".join(cache.stream(key, failing_render))
+    assert cache.get(key) is None
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
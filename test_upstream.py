@@ -0,0 +1,18 @@
+import threading
+
+import pytest
+
+import upstream
+
+
+def test_slot_gives_up_with_503_when_every_connection_is_taken(monkeypatch):
+    monkeypatch.setattr(upstream, "SLOT_TIMEOUT", 0.05)
+    monkeypatch.setitem(upstream._semaphores, "elevenlabs", threading.BoundedSemaphore(1))
+    with upstream.slot("elevenlabs"):
+        with pytest.raises(upstream.UpstreamError) as info:
+            with upstream.slot("elevenlabs"):
+                pass
+    assert info.value.status_code == 503
+
+    with upstream.slot("elevenlabs"):  # released again
+        pass
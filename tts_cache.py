@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import metrics
+from singleflight import Group
+
+# ✅ Content-addressed cache for synthesized speech.
+# Each audio file is named after a hash of (text, voice id, model id, voice settings), so it never
+# changes once written and can be shared between requests, users and gunicorn workers.
+# Audio is written chunk by chunk as it arrives from ElevenLabs, so memory use does not depend on
+# the length of the answer. The first request for new audio starts a background render that writes
+# the file at ElevenLabs' pace, and every request for it reads the file as it grows, so a slow
+# listener never holds an ElevenLabs connection. Every text that has been given a URL keeps a small jobs/<key>.json file
+# (text, voice id, model id, voice settings), so any worker can render it when the URL is first
+# fetched, and render it again if the file has been evicted since. A job is forgotten
+# TTS_JOB_MAX_AGE seconds after its URL was last handed out.
+# The disk budget is shared by every worker using the directory. Each worker keeps an in-memory LRU
+# of the files it knows about; the directory itself is rescanned, outside the lock, every
+# TTS_CACHE_RESCAN_INTERVAL seconds or when the tracked total passes the budget, so files written or
+# evicted by other workers count, and the least recently used files (by mtime, refreshed on every
+# hit) go first, down to TTS_CACHE_EVICT_TO of the budget. Cache hits never wait for a scan.
+
+# Kept outside static/: audio is only served through /audio/<key>.mp3, never by listing the directory
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TTS_JOB_MAX_AGE = float(os.getenv("TTS_JOB_MAX_AGE", str(24 * 3600)))
+TTS_JOB_PRUNE_INTERVAL = float(os.getenv("TTS_JOB_PRUNE_INTERVAL", "600"))
+TTS_CACHE_RESCAN_INTERVAL = float(os.getenv("TTS_CACHE_RESCAN_INTERVAL", "60"))
+# Share of the budget to evict down to, so a full cache isn't rescanned on every write
+TTS_CACHE_EVICT_TO = float(os.getenv("TTS_CACHE_EVICT_TO", "0.9"))
+
+
+class _Render:
+    """A file being written by a background render, for the streams reading it as it grows."""
+
+    def __init__(self):
+        self.tmp_path = None
+        self.size = 0
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+
+class TTSCache:
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, rescan_interval=TTS_CACHE_RESCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.jobs_dir = os.path.join(directory, "jobs")
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._streaming = {}  # key -> _Render writing it in the background
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flight = Group()  # one ElevenLabs call per key, however many requests want it
+        self._next_rescan = 0.0
+        self._scanning = False
+        self._added_during_scan = None  # key -> size written while a rescan is running
+
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._rescan()
+        self._next_prune = 0.0
+        self._maybe_prune_jobs()
+
+    @staticmethod
+    def make_key(text, voice_id, model_id, voice_settings):
+        payload = json.dumps([text, voice_id, model_id, voice_settings], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def filename(key):
+        return f"{key}.mp3"
+
+    def path(self, key):
+        return os.path.join(self.directory, self.filename(key))
+
+    # Function to look up a cached file, returns its path or None
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)  # mark as recently used for every worker's eviction
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Never written, or evicted by another worker
+            with self._lock:
+                if key in self._entries:
+                    self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if key not in self._entries:  # written by another worker
+                self._add(key, size)
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return path
+
+    # Function to store audio bytes under a key, returns the file path
+    def put(self, key, data):
+        for _ in self._write(key, [data]):
+            pass
+        return self.path(key)
+
+    # Function to return cached audio for a text, rendering it on a miss with
+    # render(text, voice_id, model_id, voice_settings) -> iterable of byte chunks.
+    # Concurrent misses for the same key share one render.
+    def get_or_create(self, text, voice_id, model_id, voice_settings, render):
+        key = self.register(text, voice_id, model_id, voice_settings)  # so its URL outlives eviction
+        path = self.get(key)
+        if path is None:
+            def create():
+                if self._peek(key):
+                    return self.path(key)
+                for _ in self._write(key, render(text, voice_id, model_id, voice_settings)):
+                    pass
+                return self.path(key)
+            path = self.flight.do(key, create)
+        return key, path
+
+    # Function to give a text a key (and URL) now and render it only when it is first fetched
+    def register(self, text, voice_id, model_id, voice_settings):
+        key = self.make_key(text, voice_id, model_id, voice_settings)
+        job_path = self._job_path(key)
+        try:
+            os.utime(job_path)  # handed out again: keep the job for another TTS_JOB_MAX_AGE
+        except FileNotFoundError:
+            fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix=".part")
+            with os.fdopen(fd, "w") as f:
+                json.dump([text, voice_id, model_id, voice_settings], f)
+            os.replace(tmp_path, job_path)
+        self._maybe_prune_jobs()
+        return key
+
+    # Function to get the (text, voice_id, model_id, voice_settings) registered for a key, or None
+    def job(self, key):
+        try:
+            with open(self._job_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Function to stream audio for a key while it is saved: render(*job) is written to disk by a
+    # background thread (one per key, however many requests want it), and the returned generator
+    # yields the file's bytes as they are written. Returns None if the key is unknown.
+    def stream(self, key, render, chunk_size=64 * 1024):
+        job = self.job(key)
+        if job is None:
+            return None
+
+        with self._lock:
+            progress = self._streaming.get(key)
+            if progress is None:
+                progress = self._streaming[key] = _Render()
+                threading.Thread(target=self._render, args=(key, job, render, progress), daemon=True).start()
+        return self._follow(key, progress, chunk_size)
+
+    def _render(self, key, job, render, progress):
+        try:
+            for _ in self._write(key, render(*job), progress):
+                pass
+        except Exception as e:
+            progress.error = e
+        finally:
+            with self._lock:
+                self._streaming.pop(key, None)
+            with progress.changed:
+                progress.done = True
+                progress.changed.notify_all()
+
+    # Read a file that a background render is writing, waiting for each new chunk
+    def _follow(self, key, progress, chunk_size):
+        with progress.changed:
+            while progress.tmp_path is None and not progress.done:
+                if not progress.changed.wait(self.flight.timeout):
+                    raise TimeoutError(f"timed out waiting for audio {key}")
+        try:
+            f = open(progress.tmp_path or self.path(key), "rb")
+        except FileNotFoundError:  # finished (or failed) and renamed since
+            if progress.error is not None:
+                raise progress.error
+            f = open(self.path(key), "rb")
+
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if chunk:
+                    yield chunk
+                    continue
+                with progress.changed:
+                    while progress.size <= f.tell() and not progress.done:
+                        if not progress.changed.wait(self.flight.timeout):
+                            raise TimeoutError(f"timed out waiting for audio {key}")
+                    if progress.done and progress.size <= f.tell():
+                        if progress.error is not None:
+                            raise progress.error
+                        return
+
+    # Function to check for a file without touching the hit/miss counters
+    def _peek(self, key):
+        with self._lock:
+            if key in self._entries:
+                return self.path(key)
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "streaming": len(self._streaming),
+            }
+
+    # Write chunks to a temporary file, yielding each one after it is written; the file only
+    # appears under its real name once every chunk has arrived. With a _Render, readers are told
+    # where the file is and how much of it has been written.
+    def _write(self, key, chunks, progress=None):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        if progress is not None:
+            with progress.changed:
+                progress.tmp_path = tmp_path
+                progress.changed.notify_all()
+        size, write_seconds = 0, 0.0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    start = time.perf_counter()
+                    f.write(chunk)
+                    if progress is not None:
+                        f.flush()
+                    write_seconds += time.perf_counter() - start
+                    size += len(chunk)
+                    if progress is not None:
+                        with progress.changed:
+                            progress.size = size
+                            progress.changed.notify_all()
+                    yield chunk
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        metrics.observe("audio_write", write_seconds)
+
+        with self._lock:
+            self._add(key, size)
+            if self._added_during_scan is not None:
+                self._added_during_scan[key] = size
+            rescan = self._total_bytes > self.max_bytes or time.monotonic() >= self._next_rescan
+        if rescan:
+            self._rescan()
+
+    def _add(self, key, size):
+        if key in self._entries:
+            self._total_bytes -= self._entries[key]
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        self._total_bytes += size
+
+    # Rebuild the view of the directory from disk, so files written or evicted by other workers count,
+    # then, if it is over budget, delete least recently used files until it is back under
+    # TTS_CACHE_EVICT_TO of the budget (always keeping the newest one).
+    # The directory is read without the lock; only swapping the result in holds it.
+    def _rescan(self):
+        with self._lock:
+            if self._scanning:
+                return
+            self._scanning = True
+            self._added_during_scan = {}
+
+        try:
+            files = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".mp3"):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+            files.sort()
+
+            evicted = []
+            with self._lock:
+                self._entries = OrderedDict()
+                self._total_bytes = 0
+                for _, key, size in files:
+                    self._add(key, size)
+                for key, size in self._added_during_scan.items():
+                    self._add(key, size)
+                target = self.max_bytes * TTS_CACHE_EVICT_TO if self._total_bytes > self.max_bytes else self.max_bytes
+                while self._total_bytes > target and len(self._entries) > 1:
+                    key, size = self._entries.popitem(last=False)
+                    self._total_bytes -= size
+                    self.evictions += 1
+                    evicted.append(key)
+                self._next_rescan = time.monotonic() + self.rescan_interval
+        finally:
+            with self._lock:
+                self._scanning = False
+                self._added_during_scan = None
+
+        for key in evicted:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def _job_path(self, key):
+        return os.path.join(self.jobs_dir, f"{key}.json")
+
+    # Prune old jobs at most every TTS_JOB_PRUNE_INTERVAL seconds, so they can't pile up between restarts
+    def _maybe_prune_jobs(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + TTS_JOB_PRUNE_INTERVAL
+        self._prune_jobs()
+
+    # Forget texts whose URL was last handed out more than TTS_JOB_MAX_AGE seconds ago
+    def _prune_jobs(self):
+        cutoff = time.time() - TTS_JOB_MAX_AGE
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,215 @@
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# ✅ Shared, connection-pooled clients for Chatbase, OpenAI and ElevenLabs.
+# One keep-alive pool per provider per process, with timeouts and a concurrency cap,
+# so requests reuse TCP+TLS connections instead of handshaking on every call.
+# Calls are blocking: a Flask worker thread waits for each one, and throughput comes from running
+# enough worker threads (e.g. gunicorn --threads) on top of these pools, not from an event loop.
+
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+SLOT_TIMEOUT = float(os.getenv("UPSTREAM_SLOT_TIMEOUT", "30"))  # wait for a free concurrency slot
+
+# API keys and base URLs are read when a client is first built, so a .env loaded
+# by the importing script is picked up. Base URLs can point at local stubs.
+PROVIDERS = {
+    "chatbase": {
+        "base_url_env": ("CHATBASE_BASE_URL", "https://www.chatbase.co"),
+        "auth": ("Authorization", "Bearer ", "CHATBASE_API_KEY"),
+        "max_concurrency": int(os.getenv("CHATBASE_MAX_CONCURRENCY", "16")),
+    },
+    "openai": {
+        "base_url_env": ("OPENAI_BASE_URL", "https://api.openai.com"),
+        "auth": ("Authorization", "Bearer ", "OPENAI_API_KEY"),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")),
+    },
+    "elevenlabs": {
+        "base_url_env": ("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io"),
+        "auth": ("xi-api-key", "", "ELEVENLABS_API_KEY"),
+        "max_concurrency": int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "8")),
+    },
+}
+
+
+class UpstreamError(Exception):
+    """An upstream provider answered with an error status or could not be reached."""
+
+    def __init__(self, provider, status_code, details):
+        super().__init__(f"{provider} error {status_code}: {details}")
+        self.provider = provider
+        self.status_code = status_code
+        self.details = details
+
+
+_lock = threading.Lock()
+_clients = {}
+_semaphores = {provider: threading.BoundedSemaphore(cfg["max_concurrency"]) for provider, cfg in PROVIDERS.items()}
+
+
+def _client_options(provider):
+    cfg = PROVIDERS[provider]
+    header, prefix, key_env = cfg["auth"]
+    headers = {"Content-Type": "application/json"}
+    if os.getenv(key_env):
+        headers[header] = prefix + os.getenv(key_env)
+    return {
+        "base_url": os.getenv(*cfg["base_url_env"]),
+        "headers": headers,
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=cfg["max_concurrency"],
+            max_keepalive_connections=cfg["max_concurrency"],
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+# Function to get the shared sync client for a provider
+def get_client(provider):
+    client = _clients.get(provider)
+    if client is None:
+        with _lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = httpx.Client(**_client_options(provider))
+                _clients[provider] = client
+    return client
+
+
+@contextmanager
+def slot(provider):
+    """Hold one of the provider's concurrency slots for the duration of a call."""
+    semaphore = _semaphores[provider]
+    if not semaphore.acquire(timeout=SLOT_TIMEOUT):
+        raise UpstreamError(provider, 503, f"no free connection after {SLOT_TIMEOUT:g}s")
+    try:
+        yield get_client(provider)
+    finally:
+        semaphore.release()
+
+
+# Function to open `connections` pooled connections to a provider before the first real call.
+# Any HTTP answer will do, the request only exists for the TCP+TLS handshake; returns how many opened.
+def warm(provider, connections=1):
+    client = get_client(provider)
+
+    def open_one(_):
+        try:
+            client.head("/")
+            return True
+        except httpx.HTTPError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        return sum(pool.map(open_one, range(connections)))
+
+
+# Function to close every pooled connection
+def close():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+# ---------------------------------------------------------------------------
+# Request builders and response parsers
+# ---------------------------------------------------------------------------
+
+def _chatbase_request(messages, bot_id=None, stream=False):
+    data = {"messages": messages, "chatbotId": bot_id or os.getenv("CHATBASE_BOT_ID")}
+    if stream:
+        data["stream"] = True
+    return "/api/v1/chat", data
+
+
+def _openai_request(messages, model=None):
+    return "/v1/chat/completions", {"model": model or os.getenv("OPENAI_MODEL", "gpt-4"), "messages": messages}
+
+
+def _elevenlabs_request(text, voice_id, model_id, voice_settings, stream=False):
+    path = f"/v1/text-to-speech/{voice_id}" + ("/stream" if stream else "")
+    return path, {"text": text, "model_id": model_id, "voice_settings": voice_settings}
+
+
+def _check(provider, response):
+    if response.status_code != 200:
+        raise UpstreamError(provider, response.status_code, response.text)
+
+
+def _chatbase_text(response):
+    _check("chatbase", response)
+    return response.json().get("text")
+
+
+def _openai_text(response):
+    _check("openai", response)
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def _post(provider, path, data):
+    with slot(provider) as client:
+        try:
+            return client.post(path, json=data)
+        except httpx.HTTPError as e:
+            raise UpstreamError(provider, 0, str(e)) from e
+
+
+# ---------------------------------------------------------------------------
+# Calls
+# ---------------------------------------------------------------------------
+
+# Function to get a full reply from Chatbase
+def chatbase_chat(messages, bot_id=None):
+    return _chatbase_text(_post("chatbase", *_chatbase_request(messages, bot_id)))
+
+
+# Function to stream a reply from Chatbase as text chunks
+def chatbase_stream(messages, bot_id=None):
+    path, data = _chatbase_request(messages, bot_id, stream=True)
+    with slot("chatbase") as client:
+        try:
+            with client.stream("POST", path, json=data) as response:
+                if response.status_code != 200:
+                    response.read()
+                    _check("chatbase", response)
+                for chunk in response.iter_text():
+                    if chunk:
+                        yield chunk
+        except httpx.HTTPError as e:
+            raise UpstreamError("chatbase", 0, str(e)) from e
+
+
+# Function to get a reply from OpenAI chat completions
+def openai_chat(messages, model=None):
+    return _openai_text(_post("openai", *_openai_request(messages, model)))
+
+
+# Function to render speech with ElevenLabs, returns MP3 bytes
+def elevenlabs_tts(text, voice_id, model_id, voice_settings):
+    response = _post("elevenlabs", *_elevenlabs_request(text, voice_id, model_id, voice_settings))
+    _check("elevenlabs", response)
+    return response.content
+
+
+# Function to stream speech from ElevenLabs, yields MP3 chunks as they are produced.
+# The concurrency slot is held until the generator finishes, so read it at ElevenLabs' pace
+# (TTSCache writes it to disk) rather than at a listener's.
+def elevenlabs_tts_stream(text, voice_id, model_id, voice_settings, chunk_size=16 * 1024):
+    path, data = _elevenlabs_request(text, voice_id, model_id, voice_settings, stream=True)
+    with slot("elevenlabs") as client:
+        try:
+            with client.stream("POST", path, json=data) as response:
+                if response.status_code != 200:
+                    response.read()
+                    _check("elevenlabs", response)
+                yield from response.iter_bytes(chunk_size)
+        except httpx.HTTPError as e:
+            raise UpstreamError("elevenlabs", 0, str(e)) from e
+